@@ -0,0 +1,62 @@
+"""
+Ayumi - Discord bot
+Copyright (C) 2020 - Saphielle Akiyama | saphielle.akiyama@gmail.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+import argparse
+import json
+import timeit
+import typing as tp
+
+import orjson
+
+import utils
+from benchmarks.jikan_models import fake_season
+
+
+def bench(name: str, func: tp.Callable, size: int) -> None:
+    runs, total = timeit.Timer(func).autorange()
+    print(f"{name:<24} {size / 1024:>8.1f} KB {total / runs * 1e3:>8.2f} ms / loads")
+
+
+def main(path: tp.Optional[str] = None):
+    """
+    Size and decoding time of a cached season, the raw json we used to store against the codec,
+    run it from the Ayumi folder with a recorded payload if you have one:
+
+    python -m benchmarks.cache_codec [--payload season.json]
+
+    Without it a payload shaped like jikan's /season is generated
+    """
+    raw = json.loads(open(path).read()) if path else fake_season()
+
+    print(f"{len(raw['anime'])} entries\n")
+
+    encoded = orjson.dumps(raw)
+    bench('orjson (raw)', lambda: orjson.loads(encoded), len(encoded))
+    bench('orjson (raw) + parse', lambda: utils.jikan.project_payload('anime', orjson.loads(encoded)), len(encoded))
+
+    codec = utils.CompactCodec(ext_types=utils.jikan.EXT_TYPES)
+    encoded = codec.dumps(utils.jikan.project_payload('anime', raw))
+    bench('CompactCodec (projected)', lambda: codec.loads(encoded), len(encoded))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compares the cached size and decoding time of a season")
+    parser.add_argument('--payload', help="a recorded jikan /season response, generated if missing")
+
+    main(parser.parse_args().payload)
@@ -0,0 +1,116 @@
+"""
+Ayumi - Discord bot
+Copyright (C) 2020 - Saphielle Akiyama | saphielle.akiyama@gmail.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import json
+import sys
+import timeit
+import tracemalloc
+import typing as tp
+
+import utils
+from cogs.myanimelist import JikanAnimeSource
+
+ENTRIES = 250
+
+RATINGS = 'G - All Ages', 'PG-13 - Teens 13 or older', 'R - 17+ (violence & profanity)', 'Rx'
+
+
+def fake_season(entries: int = ENTRIES) -> dict:
+    """Returns a payload with the same shape (and roughly the same size) as jikan's /season"""
+    return {
+        'request_hash': 'request:season:0', 'request_cached': False, 'request_cache_expiry': 86400,
+        'season_name': 'Fall', 'season_year': 2020,
+        'anime': [{
+            'mal_id': i,
+            'url': f'https://myanimelist.net/anime/{i}/Some_Anime_{i}',
+            'title': f'Some Anime {i}',
+            'image_url': f'https://cdn.myanimelist.net/images/anime/{i}/1.jpg',
+            'synopsis': 'Lorem ipsum dolor sit amet. ' * 30,
+            'type': 'TV',
+            'airing_start': '2020-10-01T15:00:00+00:00',
+            'start_date': '2020-10-01T15:00:00+00:00',
+            'episodes': 12,
+            'members': 1000 * i,
+            'genres': [{'mal_id': g, 'type': 'anime', 'name': f'Genre {g}',
+                        'url': f'https://myanimelist.net/anime/genre/{g}/Genre_{g}'} for g in range(4)],
+            'source': 'Manga',
+            'producers': [{'mal_id': p, 'type': 'anime', 'name': f'Studio {p}',
+                           'url': f'https://myanimelist.net/anime/producer/{p}/Studio_{p}'} for p in range(2)],
+            'score': 7.5,
+            'licensors': ['Funimation'],
+            'r18': False,
+            'kids': False,
+            'continuing': False,
+            'rated': RATINGS[i % len(RATINGS)],
+        } for i in range(entries)],
+    }
+
+
+def deep_size(payload: tp.Callable[[], tp.Any]) -> int:
+    """Returns how many bytes were allocated to build something"""
+    tracemalloc.start()
+
+    kept = payload()  # noqa: F841
+
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return size
+
+
+def bench(name: str, func: tp.Callable, per: int) -> None:
+    runs, total = timeit.Timer(func).autorange()
+    print(f"{name:<32} {total / runs / per * 1e6:>8.2f} µs / entry")
+
+
+def main(path: tp.Optional[str] = None):
+    """
+    Parse + render throughput of the jikan models over a season payload,
+    run it from the Ayumi folder with a recorded payload if you have one:
+
+    python -m benchmarks.jikan_models [season.json]
+
+    Without it a payload shaped like jikan's /season is generated
+    """
+    raw = json.loads(open(path).read()) if path else fake_season()
+    count = len(raw['anime'])
+
+    print(f"{count} entries\n")
+
+    text = json.dumps(raw)
+
+    bench('json.loads', lambda: json.loads(text), count)
+    bench('parse (models)', lambda: utils.jikan.project_payload('anime', raw), count)
+
+    dataset = utils.jikan.project_payload('anime', raw)['anime']
+    codec = utils.CompactCodec(ext_types=utils.jikan.EXT_TYPES)
+    encoded = codec.dumps({'anime': dataset})
+
+    bench('codec round trip', lambda: codec.loads(codec.dumps({'anime': dataset})), count)
+
+    source = JikanAnimeSource('footer', dataset=dataset, view=dataset.view(is_nsfw=True))
+    bench('render', lambda: [source.render(entry) for entry in dataset], count)
+
+    print()
+    print(f"{'memory (dicts)':<32} {deep_size(lambda: json.loads(text)) / count:>8.0f} B / entry")
+    print(f"{'memory (models)':<32} {deep_size(lambda: utils.jikan.project_payload('anime', json.loads(text))) / count:>8.0f} B / entry")
+    print(f"{'cached size':<32} {len(encoded) / count:>8.0f} B / entry")
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2])
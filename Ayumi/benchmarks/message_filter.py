@@ -0,0 +1,134 @@
+"""
+Ayumi - Discord bot
+Copyright (C) 2020 - Saphielle Akiyama | saphielle.akiyama@gmail.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import random
+import sys
+import time
+import types
+import typing as tp
+
+from discord.ext import commands
+
+import core
+import utils
+from cogs.misc import Misc
+
+BOT_ID = 735050442394402816
+
+GUILDS = 1000  # guilds with their own prefix
+
+
+def fake_message(content: str, guild_id: int, *, bot: bool = False) -> types.SimpleNamespace:
+    return types.SimpleNamespace(content=content, _state=None,
+                                 guild=types.SimpleNamespace(id=guild_id),
+                                 author=types.SimpleNamespace(id=guild_id + 1, bot=bot))
+
+
+def fake_messages(count: int, *, command_ratio: float = 0.02) -> tp.List[types.SimpleNamespace]:
+    """Mostly chatter, a few commands, mentions and bot messages"""
+    rng = random.Random(0)
+    messages = []
+
+    for _ in range(count):
+        guild_id = rng.randrange(GUILDS * 2)
+        roll = rng.random()
+
+        if roll < command_ratio / 2:
+            content = 'ayu mal top anime'
+        elif roll < command_ratio:
+            content = f'<@!{BOT_ID}> how are you ?'
+        else:
+            content = rng.choice(('hello', 'lol', 'did anyone watch the new episode', ':)', 'gm everyone'))
+
+        messages.append(fake_message(content, guild_id, bot=roll > 0.95))
+
+    return messages
+
+
+class BenchBot(core.Bot):
+    """
+    core.Bot without its config file, connections nor login,
+    with the cleverbot listener and a no-op mal command registered
+    """
+
+    def __init__(self, *, prefilter: bool):
+        commands.Bot.__init__(self, command_prefix=self.get_config_prefix, help_command=None)
+
+        self.prefilter = prefilter
+
+        self._connection.user = types.SimpleNamespace(id=BOT_ID)  # what get_context compares authors to
+        self._config = {'discord': {'prefix': 'ayu '}}
+        self._prefixes = {guild_id: f'g{guild_id} ' for guild_id in range(GUILDS)}
+        self.mention_prefixes = (f'<@{BOT_ID}> ', f'<@!{BOT_ID}> ')
+        self.extension_loader = utils.ExtensionLoader(self)
+        self.rebuild_triggers()
+
+        misc = Misc.__new__(Misc)  # only the listener, which returns early for anything but mentions
+        misc.bot = self
+        misc.cleverbot = None
+        self.add_cog(misc)
+
+        @self.command(name='mal')
+        async def mal(ctx, *args):
+            pass
+
+    def add_cog(self, cog: commands.Cog):
+        commands.Bot.add_cog(self, cog)  # no source index
+
+    def wants_message(self, message: types.SimpleNamespace) -> bool:
+        return not self.prefilter or super().wants_message(message)
+
+
+async def dispatch_all(bot: BenchBot, messages: tp.List[types.SimpleNamespace]) -> float:
+    """Dispatches every message and waits for the listeners they started, returns how long it took"""
+    start = time.perf_counter()
+
+    for message in messages:
+        bot.dispatch('message', message)
+
+    await asyncio.gather(*asyncio.all_tasks() - {asyncio.current_task()})
+
+    return time.perf_counter() - start
+
+
+async def run(count: int):
+    # mentions would go on to ask cleverbot, they go through the same listener with and without the pre-filter
+    messages = [m for m in fake_messages(count) if not m.content.startswith('<@')]
+
+    for name, prefilter in (('before', False), ('pre-filter', True)):
+        bot = BenchBot(prefilter=prefilter)
+
+        best = min([await dispatch_all(bot, messages) for _ in range(3)])
+
+        print(f"{name:<12} {len(messages) / best:>14,.0f} messages / s")
+
+
+def main(count: str = '100000'):
+    """
+    Messages per second Bot.dispatch goes through, with and without the pre-filter,
+    without it every message schedules on_message (get_context + invoke) and the cleverbot listener,
+    run it from the Ayumi folder:
+
+    python -m benchmarks.message_filter [messages]
+    """
+    asyncio.run(run(int(count)))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2])
@@ -0,0 +1,80 @@
+"""
+Ayumi - Discord bot
+Copyright (C) 2020 - Saphielle Akiyama | saphielle.akiyama@gmail.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+import json
+import sys
+import timeit
+import typing as tp
+
+from discord.ext import menus
+
+import utils
+from benchmarks.jikan_models import fake_season
+from cogs.myanimelist import JikanAnimeSource
+
+
+def old_source(entries: tp.List[dict]) -> menus.ListPageSource:
+    """What JikanAnimeSource's constructor used to do, a filtered copy of the raw entries for every menu"""
+    def check_content(data: dict) -> bool:
+        return not data.get('r18', False) and data.get('rated').upper() not in utils.jikan.NSFW_RATINGS
+
+    return menus.ListPageSource([*filter(check_content, entries)], per_page=1)
+
+
+def bench(name: str, func: tp.Callable, per: int, unit: str) -> None:
+    runs, total = timeit.Timer(func).autorange()
+    print(f"{name:<32} {total / runs / per * 1e6:>8.2f} µs / {unit}")
+
+
+def main(path: tp.Optional[str] = None):
+    """
+    Cost of displaying a MAL page, rendered on every flip versus taken from the shared cache,
+    and of making a menu's source, run it from the Ayumi folder with a recorded payload if you have one:
+
+    python -m benchmarks.page_render [season.json]
+
+    Without it a payload shaped like jikan's /season is generated
+    """
+    raw = json.loads(open(path).read()) if path else fake_season()
+    count = len(raw['anime'])
+
+    print(f"{count} entries\n")
+
+    dataset = utils.jikan.project_payload('anime', raw)['anime']
+
+    source = JikanAnimeSource('footer', dataset=dataset, view=dataset.view(is_nsfw=True), data_key=('bench', 0))
+
+    JikanAnimeSource.rendered_pages.clear()
+
+    bench('render (cold)', lambda: [source.render(entry) for entry in dataset], count, 'page')
+
+    for index in range(count):  # fills the shared cache
+        source.format_page(None, index)
+
+    bench('format_page (warm)', lambda: [source.format_page(None, index) for index in range(count)], count, 'page')
+
+    print()
+
+    bench('filtered copy (old source)', lambda: old_source(raw['anime']), 1, 'menu')
+    bench('Dataset.view (new source)',
+          lambda: JikanAnimeSource('footer', dataset=dataset, view=dataset.view(is_nsfw=False)), 1, 'menu')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2])
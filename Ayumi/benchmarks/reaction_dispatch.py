@@ -0,0 +1,94 @@
+"""
+Ayumi - Discord bot
+Copyright (C) 2020 - Saphielle Akiyama | saphielle.akiyama@gmail.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import sys
+import time
+import types
+import typing as tp
+
+from discord.ext import commands
+
+import utils
+
+EVENT = 'raw_reaction_add'
+
+
+class FakeMenu:
+    """Checks reactions like menus.Menu.reaction_check does"""
+
+    def __init__(self, message_id: int):
+        self.message_id = message_id
+
+    def reaction_check(self, payload) -> bool:
+        if payload.message_id != self.message_id:
+            return False
+
+        return payload.emoji == '▶'
+
+
+def measure(dispatch: tp.Callable[[str, tp.Any], None], menus: int, reactions: int) -> float:
+    """Returns the average time to dispatch a reaction, in µs"""
+    payloads = [types.SimpleNamespace(message_id=i % menus, user_id=1, emoji='⏹') for i in range(reactions)]
+
+    start = time.perf_counter()
+
+    for payload in payloads:  # the emoji isn't a button, so waiters stay registered
+        dispatch(EVENT, payload)
+
+    return (time.perf_counter() - start) / reactions * 1e6
+
+
+async def bench(menus: int, reactions: int) -> tp.Tuple[float, float]:
+    bot = commands.Bot(command_prefix='!')
+    router = utils.ReactionRouter()
+
+    waiters = []
+
+    for message_id in range(menus):
+        check = FakeMenu(message_id).reaction_check
+        waiters.append(asyncio.ensure_future(commands.Bot.wait_for(bot, EVENT, check=check)))
+        waiters.append(asyncio.ensure_future(router.wait_for(EVENT, message_id, check)))
+
+    await asyncio.sleep(0)
+
+    try:
+        return measure(bot.dispatch, menus, reactions), measure(router.dispatch, menus, reactions)
+
+    finally:
+        for waiter in waiters:
+            waiter.cancel()
+
+        await asyncio.gather(*waiters, return_exceptions=True)
+
+
+def main(reactions: str = '2000'):
+    """
+    Cost of dispatching a reaction with N live menus, run it from the Ayumi folder:
+
+    python -m benchmarks.reaction_dispatch [reactions]
+    """
+    print(f"{'menus':>8} {'wait_for':>14} {'router':>14}")
+
+    for menus in (10, 1000, 10000):
+        before, after = asyncio.get_event_loop().run_until_complete(bench(menus, int(reactions)))
+        print(f"{menus:>8} {before:>11.2f} µs {after:>11.2f} µs")
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2])
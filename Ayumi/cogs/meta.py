@@ -16,7 +16,7 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-import inspect
+import asyncio
 import random
 import textwrap
 import typing as tp
@@ -27,8 +27,8 @@ from discord.ext import commands, menus
 import core
 import utils
 
-GITHUB_PATH = '/blob/master/Ayumi/'
 CONTAINS_COMMANDS = commands.Cog, commands.Group
+MAX_PREFIX_LENGTH = 15
 
 SPACES   = '    '
 VERTICAL = '│   '
@@ -37,13 +37,50 @@ L_BRANCH = '└── '
 CIRCLE   = '○ '
 
 
+def walk_example_commands(entity: tp.Union[commands.Cog, commands.Group]) -> tp.List[commands.Command]:
+    """The commands we can pick examples from"""
+    return [c for c in entity.walk_commands() if not getattr(c, 'only_sends_help', False)]
+
+
+class HelpPages(tp.NamedTuple):
+    pages: tp.List[str]
+    walked_commands: tp.List[commands.Command]
+
+
+class HelpCache:
+    """
+    Help pages rendered once per entity and permission profile,
+    everything is dropped as soon as the command tree changes (an extension got loaded, reloaded or unloaded)
+    """
+
+    def __init__(self, bot: core.Bot, *, max_entries: int = 256):
+        self.bot = bot
+        self.version = bot.commands_version
+        self.pages = utils.LRUCache(max_entries=max_entries)
+
+    def key(self, entity: tp.Union[commands.Cog, commands.Group], profile: tp.Hashable) -> tp.Hashable:
+        """The version is part of the key so pages built while an extension got reloaded are never served"""
+        return self.bot.commands_version, isinstance(entity, commands.Cog), entity.qualified_name, profile
+
+    def get(self, key: tp.Hashable) -> tp.Optional[HelpPages]:
+        if self.version != self.bot.commands_version:
+            self.pages.clear()
+            self.version = self.bot.commands_version
+
+        return self.pages.get(key, None)
+
+    def set(self, key: tp.Hashable, value: HelpPages) -> None:
+        self.pages.set(key, value, size=sum(map(len, value.pages)))
+
+
 class CogAndGroupHelpSource(utils.ListPageSource):
-    def __init__(self, entries: tp.List[str], *, entity: tp.Union[commands.Cog, commands.Group], title: str):  # future proofing
+    def __init__(self, entries: tp.List[str], *, entity: tp.Union[commands.Cog, commands.Group], title: str,
+                 walked_commands: tp.Optional[tp.List[commands.Command]] = None):
         super().__init__(entries, per_page=1)
 
         self.entity = entity
 
-        self.walked_commands = [c for c in entity.walk_commands() if not getattr(c, 'only_sends_help', False)]
+        self.walked_commands = walk_example_commands(entity) if walked_commands is None else walked_commands
 
         self.title = title.format(entity)
 
@@ -98,6 +135,40 @@ class HelpCommand(commands.MinimalHelpCommand):
             default=name
         )
 
+    async def filter_commands(self, commands_: tp.Iterable[commands.Command], *, sort: bool = False,
+                              key: tp.Optional[tp.Callable[[commands.Command], tp.Any]] = None) -> tp.List[commands.Command]:
+        """Same as the default one, except that the checks of every command run concurrently"""
+
+        if sort and key is None:
+            key = lambda c: c.name  # noqa: E731
+
+        contents = [c for c in commands_ if self.show_hidden or not c.hidden]
+
+        if self.verify_checks is not False and (self.verify_checks or self.context.guild):
+
+            async def predicate(command: commands.Command) -> bool:
+                try:
+                    return await command.can_run(self.context)
+                except commands.CommandError:
+                    return False
+
+            results = await asyncio.gather(*map(predicate, contents))
+
+            contents = [c for c, can_run in zip(contents, results) if can_run]
+
+        return sorted(contents, key=key) if sort else contents
+
+    async def permission_profile(self) -> tp.Hashable:
+        """
+        Everything my checks look at, people sharing a profile see the same help,
+        a new check depending on something else has to be added here
+        """
+        ctx = self.context
+
+        permissions = getattr(ctx.author, 'guild_permissions', None)
+
+        return await ctx.bot.is_owner(ctx.author), ctx.guild is not None, permissions and permissions.value
+
     async def tree(self, contents: tp.Union[commands.Cog, commands.Group],
                    *, prefix: str = '') -> tp.AsyncGenerator[str, None]:
         """Yields some fancy lines to display a tree"""
@@ -139,6 +210,24 @@ class HelpCommand(commands.MinimalHelpCommand):
 
     async def display_grouped_menu(self, title: str, entity: tp.Union[commands.Group, commands.Cog]):
         """Handles the menu for cog and group help"""
+        help_pages = await self.grouped_pages(entity)
+
+        source = CogAndGroupHelpSource(help_pages.pages, entity=entity, title=title,
+                                       walked_commands=help_pages.walked_commands)
+
+        menu = menus.MenuPages(source, delete_message_after=True)
+
+        await self.context.start_menu(menu, kind='help', channel=self.get_destination(), wait=True)
+
+    async def grouped_pages(self, entity: tp.Union[commands.Group, commands.Cog]) -> HelpPages:
+        """Renders the tree of a cog / group, or reuses the pages of someone with the same permissions"""
+        cache: HelpCache = self.cog.help_cache
+
+        key = cache.key(entity, await self.permission_profile())
+
+        if (help_pages := cache.get(key)) is not None:
+            return help_pages
+
         paginator = commands.Paginator(max_size=2048)
 
         lines = [line async for line in self.tree(entity)]
@@ -148,11 +237,11 @@ class HelpCommand(commands.MinimalHelpCommand):
         for line in dedented:
             paginator.add_line(line)
 
-        source = CogAndGroupHelpSource(paginator.pages, entity=entity, title=title)
+        help_pages = HelpPages(paginator.pages, walk_example_commands(entity))
 
-        menu = menus.MenuPages(source, delete_message_after=True)
+        cache.set(key, help_pages)
 
-        await menu.start(self.context, channel=self.get_destination(), wait=True)
+        return help_pages
 
     async def send_cog_help(self, cog: commands.Cog):
         """Help for cogs"""
@@ -204,6 +293,8 @@ class Meta(commands.Cog):
 
         self._original_help_command = bot.help_command
 
+        self.help_cache = HelpCache(bot)
+
         bot.help_command = HelpCommand()
 
         bot.help_command.cog = self
@@ -213,43 +304,61 @@ class Meta(commands.Cog):
 
     # -- Source -- #
     @commands.command(aliases=['src'])
-    @commands.max_concurrency(1, commands.BucketType.user)
     async def source(self, ctx: core.Context, *, target: CommandConverter = None):
         """Gets the source for a command"""
         if target is None:
-            return await ctx.send(f"Drop a star to support my development !\n<{self.bot.config['github']['url']}>")
-
-        callback = target.callback
+            if not (github_url := self.bot.config.get('github', {}).get('url')):
+                raise commands.BadArgument("Sorry ! My repository isn't configured")
 
-        if 'help' in target.name:  # special case
-            callback = self.bot.help_command.__class__
+            return await ctx.send(f"Drop a star to support my development !\n<{github_url}>")
 
-        try:
-            source_lines, line_number = inspect.getsourcelines(callback)
-
-        except OSError:
+        if (source := self.bot.source_index.get(target.qualified_name)) is None:
             raise commands.BadArgument("Sorry ! I couldn't retrieve this command's source code")
 
-        source_lines = textwrap.dedent(''.join(source_lines))
-
-        module = callback.__module__.replace('.', '/') + '.py'
-
-        github_link = f"{self.bot.config['github']['url']}{GITHUB_PATH}{module}#L{line_number}"
-
         embed = utils.Embed(title=f"""Here's the source the command named "{target}" !""")
 
-        embed.add_fields(('External view', f'[Github]({github_link})'),
-                         ('Module', discord.utils.escape_markdown(module)),
-                         ('Line', line_number))
+        external_view = f'[Github]({source.github_link})' if source.github_link else "Sorry ! My repository isn't configured"
+
+        embed.add_fields(('External view', external_view),
+                         ('Module', discord.utils.escape_markdown(source.module)),
+                         ('Line', source.line_number))
 
-        if len(source_lines) > 2000:
+        if len(source.source) > 2000:
 
             content = "Sorry ! The source is too long so I can only send the external view"
 
             return await ctx.send(content=content, embed=embed)
 
-        src = utils.codeblock(source_lines, lang='py')
-        await utils.OnePage({'embed': embed, 'content': src}).start(ctx)
+        src = utils.codeblock(source.source, lang='py')
+        await ctx.start_menu(utils.OnePage({'embed': embed, 'content': src}), kind='source')
+
+    # -- Prefix -- #
+
+    @commands.group(invoke_without_command=True)
+    @commands.guild_only()
+    async def prefix(self, ctx: core.Context):
+        """Displays my prefix in this server"""
+        prefix = self.bot.get_config_prefix(self.bot, ctx.message)
+        await ctx.send(f"My prefix here is \"{discord.utils.escape_markdown(prefix)}\"")
+
+    @prefix.command(name='set')
+    @commands.guild_only()
+    @commands.has_guild_permissions(manage_guild=True)
+    async def prefix_set(self, ctx: core.Context, prefix: str):
+        """Changes my prefix in this server, use quotes to end it with a space"""
+        if not prefix.strip() or len(prefix) > MAX_PREFIX_LENGTH:
+            raise commands.BadArgument(f"Sorry ! The prefix must be between 1 and {MAX_PREFIX_LENGTH} characters long")
+
+        await self.bot.prefixes.set(ctx.guild.id, prefix)
+        await ctx.send(f"My prefix here is now \"{discord.utils.escape_markdown(prefix)}\"")
+
+    @prefix.command(name='reset')
+    @commands.guild_only()
+    @commands.has_guild_permissions(manage_guild=True)
+    async def prefix_reset(self, ctx: core.Context):
+        """Goes back to my default prefix in this server"""
+        await self.bot.prefixes.reset(ctx.guild.id)
+        await ctx.send("I'm back to my default prefix here")
 
 
 def setup(bot: core.Bot):
@@ -16,13 +16,39 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+import asyncio
 import random
+import typing as tp
 
 import async_cleverbot as ac
 import discord
 from discord.ext import commands
 
 import core
+import utils
+
+CLEVERBOT_TIMEOUT = 10  # seconds
+
+CLEVERBOT_METRICS = ('ayumi_cleverbot_in_flight', 'ayumi_cleverbot_waiting', 'ayumi_cleverbot_requests_total',
+                     'ayumi_cleverbot_breaker_total', 'ayumi_cleverbot_breaker_open')
+
+
+class ConversationContext(ac.DictContext):
+    """Sends the history we got from the conversation store instead of keeping its own forever"""
+
+    def __init__(self):
+        super().__init__()
+        self._histories: tp.Dict[int, tp.Tuple[str, ...]] = {}
+
+    def prepare(self, id_: int, history: tp.Tuple[str, ...]) -> None:
+        """Sets the history to send with the next question of this user"""
+        self._histories[id_] = history
+
+    def update_context(self, id_: int, query: str) -> dict:
+        if history := self._histories.pop(id_, ()):
+            return dict(text=query, context=list(history))
+
+        return dict(text=query)
 
 
 class Misc(commands.Cog):
@@ -32,13 +58,60 @@ class Misc(commands.Cog):
     
     def __init__(self, bot: core.Bot):
         self.bot = bot
+        self.conversations = utils.ConversationStore(bot.redis)
         self.cleverbot = cb = ac.Cleverbot(api_key=bot.config['travitia']['token'],
-                                           session=bot.session, context=ac.DictContext())
+                                           session=bot.session, context=ConversationContext())
 
         cb.emotions = tuple(ac.Emotion)
 
+        # a raid of mentions shouldn't pile up requests to travitia
+        self.cleverbot_limiter = utils.ConcurrencyLimiter(limit=4, per_key=1, max_waiting=10)
+        self.cleverbot_breaker = utils.CircuitBreaker(failure_threshold=5, reset_after=30)
+
+        self.register_metrics()
+
+    def cog_unload(self):
+        self.bot.loop.create_task(self.conversations.close())
+        self.bot.metrics.remove(*CLEVERBOT_METRICS)
+
     # -- Cleverbot -- #
 
+    def register_metrics(self):
+        """Exposes the cleverbot limiter and breaker on the bot's metrics"""
+        metrics = self.bot.metrics
+        limiter = self.cleverbot_limiter
+        breaker = self.cleverbot_breaker
+
+        metrics.collect('ayumi_cleverbot_in_flight', 'Cleverbot requests running', lambda: {(): limiter.in_flight})
+
+        metrics.collect('ayumi_cleverbot_waiting', 'Cleverbot requests waiting for a slot',
+                        lambda: {(): limiter.waiting})
+
+        metrics.collect('ayumi_cleverbot_requests_total', 'Cleverbot requests accepted / rejected by the limiter',
+                        lambda: limiter.stats, ('outcome',), type='counter')
+
+        metrics.collect('ayumi_cleverbot_breaker_total', 'Cleverbot calls by outcome, as seen by the breaker',
+                        lambda: breaker.stats, ('outcome',), type='counter')
+
+        metrics.collect('ayumi_cleverbot_breaker_open', 'Whether calls to cleverbot are being short circuited',
+                        lambda: {(): int(breaker.state is not utils.concurrency.BreakerState.CLOSED)})
+
+    async def ask_cleverbot(self, author_id: int, question: str, conversation: utils.Conversation) -> ac.Response:
+        """Asks cleverbot, one request per user at most, and nothing while it keeps failing"""
+        emotion = self.cleverbot.emotions[conversation.emotion]  # storing only the index is a bit lighter, I guess
+
+        async with self.cleverbot_limiter.slot(author_id), self.cleverbot_breaker:
+            self.cleverbot.context.prepare(author_id, conversation.history)
+
+            try:
+                with utils.metrics.stage('cleverbot'):
+                    return await asyncio.wait_for(self.cleverbot.ask(query=question, id_=author_id, emotion=emotion),
+                                                  timeout=CLEVERBOT_TIMEOUT)
+
+            except Exception as error:
+                utils.metrics.UPSTREAM_ERRORS.inc(service='cleverbot', error=error.__class__.__name__)
+                raise
+
     @commands.Cog.listener('on_message')
     async def cleverbot_listener(self, msg: discord.Message, *, question: str = ''):
         """Handles the implementation for cleverbot"""
@@ -46,32 +119,38 @@ class Misc(commands.Cog):
         bot = self.bot
         cb = self.cleverbot
 
-        # Filtering out messages that don't start with the bot's mention
-        if msg.author.bot:
-            return
-
+        # Filtering out messages that don't start with the bot's mention, bots were already filtered out
         if not question:
-            for mention in (bot.user.mention + ' ', f'<@!{bot.user.id}> '):
+            for mention in bot.mention_prefixes:
                 if content.startswith(mention):
                     question = content[len(mention):]
                     break
             else:
                 return
 
-        key = f'cleverbot {msg.author.id}'
+        if utils.metrics.current_command.get() is None:  # mentions don't go through a command
+            utils.metrics.current_command.set('cleverbot')
+
+        author_id = msg.author.id
+
+        if (conversation := await self.conversations.get(author_id)) is None:
+            conversation = utils.Conversation(emotion=random.randint(0, len(cb.emotions) - 1))
 
-        emotion_index = await bot.redis.get(key)
+        try:
+            async with msg.channel.typing():
+                response = await self.ask_cleverbot(author_id, question, conversation)
 
-        if emotion_index is None:
-            emotion_index = random.randint(0, len(ac.Emotion) - 1)
-            await bot.redis.set(key, emotion_index, expire=600)
+        except utils.TooBusy:
+            return await msg.channel.send(f"{msg.author.mention}, Sorry ! I'm talking to too many people right now")
 
-        emotion = cb.emotions[int(emotion_index)]  # storing only the index is a bit lighter, I guess
+        except utils.CircuitOpen:
+            return await msg.channel.send(f"{msg.author.mention}, Sorry ! I can't think right now, retry in a bit")
 
-        async with msg.channel.typing():
-            response = await cb.ask(query=question, id_=msg.author.id, emotion=emotion)
+        max_history = self.conversations.max_history
+        self.conversations.set(author_id, conversation.add(question, response.text, max_history=max_history))
 
-        await msg.channel.send(f"> {question}\n{msg.author.mention}, {response.text}")
+        with utils.metrics.stage('send'):
+            await msg.channel.send(f"> {question}\n{msg.author.mention}, {response.text}")
 
     @commands.command()
     async def ask(self, ctx: core.Context, *, question: str):
@@ -16,55 +16,89 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-import asyncio
 import collections
+import functools
+import time
+import traceback
 import typing as tp
 import datetime as dt
 
 import jikanpy
 import humanize
-from discord.ext import commands, menus
+from discord.ext import commands, menus, tasks
 
 import core
 import utils
-import orjson
 
-BucketType = commands.BucketType
-CooldownMapping = commands.CooldownMapping
 Rating = collections.namedtuple('Rating', 'desc nsfw')
 
-NSFW_RATINGS = {'R+'}
 EXAMPLE_ANIMES = 'no game no life', 'jojo', 'pokemon'
 EXAMPLE_MANGAS = 'attack on Titan', 'demon slayer', 'death note'
 
+API_LIMITS = utils.RateLimit(30, 60), utils.RateLimit(2, 1)  # jikan's limits, shared by every process
+API_MAX_QUEUE = 20  # requests beyond that are rejected right away instead of waiting for ages
+
+RENDERED_PAGE_TTL = 3600
+
+CACHE_TTL = 43200  # past this, cached data is still served but refreshed in the background
+HARD_CACHE_TTL = 86400  # past this, cached data is only served if the api is down
+CACHE_RETENTION = 604800  # how long the last known good data is kept around
+SEARCH_TTL = 3600  # search results change more often than seasons
+HARD_SEARCH_TTL = 21600
+INDEX_MIN_SIMILARITY = 0.9  # the index only knows what we fetched, anything less than a close match goes to jikan
+JIKAN_PAGE_SIZE = 50  # searches returning less results than that weren't truncated
+INDEX_PATH = 'data/mal_index.json.gz'
+INDEX_SAVE_INTERVAL = 600
+METRICS = ('ayumi_jikan_queue_depth', 'ayumi_jikan_in_flight', 'ayumi_jikan_queue_wait_seconds',
+           'ayumi_jikan_requests_total', 'ayumi_jikan_coalesced_total', 'ayumi_mal_index_entries')
+
+WARM_INTERVAL = 1800  # how often the warmer checks the cache
+WARM_BEFORE = 3600  # entries getting stale sooner than this get refreshed by the warmer
+
+
+def current_season(date: tp.Optional[dt.date] = None) -> tp.Tuple[str, int]:
+    """Returns the season a date belongs to, along with the season's year"""
+    date = date or dt.date.today()
+
+    yday = date.timetuple().tm_yday
+
+    for (start, end), season in utils.SEASONS.items():
+        if start <= yday <= end:
+            return season, date.year
+
+    # winter overlaps two years, late december belongs to the next year's winter
+    return 'winter', date.year + (yday >= 356)
+
+
+def next_season(season: str, year: int) -> tp.Tuple[str, int]:
+    """Returns the season that comes after the given one"""
+    seasons = tuple(utils.SEASONS.values())
+
+    following = seasons[(seasons.index(season) + 1) % len(seasons)]
+
+    return following, year + (following == 'winter')
+
 
 class JikanAnimeSource(menus.ListPageSource):
     """
     A (very) general template able to handle most
-    of jikan's data
+    of jikan's data, the pages are the indices of the entries to display
+    and rendered pages are shared between menus displaying the same data
     """
 
-    @staticmethod
-    def check_content(data: dict) -> bool:
-        if data.get('r18', False):
-            return False
+    rendered_pages = utils.LRUCache(max_entries=1024)
 
-        elif data.get('rated').upper() in NSFW_RATINGS:
-            return False
-
-        return True
-
-    def __init__(self, footer: str, *, entries: tp.List[dict], is_nsfw: bool):
+    def __init__(self, footer: str, *, dataset: utils.jikan.Dataset, view: tp.Sequence[int],
+                 data_key: tp.Optional[tp.Hashable] = None):
         self.footer = footer
+        self.data = dataset  # shared with every other menu displaying it, never copied
+        self.data_key = data_key  # identifies this version of the data, pages are only shared if it's set
 
-        if not is_nsfw:
-            entries = [*filter(self.check_content, entries)]
-
-        super().__init__(entries, per_page=1)
+        super().__init__(view, per_page=1)
 
     @staticmethod
-    def format_named_data(data: tp.List[dict]):
-        return '\n'.join([f"[{d.get('name')}]({d.get('url')})" for d in data])
+    def format_named_data(data: tp.Sequence[tp.Union[utils.jikan.Genre, utils.jikan.Producer]]):
+        return '\n'.join([f"[{d.name}]({d.url})" for d in data])
 
     @staticmethod
     def format_date(data: str):
@@ -75,53 +109,69 @@ class JikanAnimeSource(menus.ListPageSource):
         except (ValueError, TypeError):
             return data
 
-    def format_page(self, menu: menus.Menu, anime: dict):
+    def format_page(self, menu: menus.Menu, index: int):
+        """Renders a page once, then reuses it"""
+        if self.data_key is None:
+            with utils.metrics.stage('render'):
+                return self.render(self.data[index])
+
+        key = (self.data_key, index, self.footer)
+
+        if (embed := self.rendered_pages.get(key)) is utils.cache.MISSING:
+            with utils.metrics.stage('render'):
+                embed = self.render(self.data[index])
+
+            # dates are relative to today, so pages don't live forever
+            self.rendered_pages.set(key, embed, ttl=RENDERED_PAGE_TTL)
+
+        return embed
+
+    def render(self, entry: utils.jikan.Entry):
         """An extremely lazy way to put everything together"""
+        is_anime = isinstance(entry, utils.jikan.Anime)
 
-        title = [anime.get('title'), ]  # api is kind of inconsistant
+        title = [entry.title, ]  # api is kind of inconsistant
 
-        if rating := anime.get('rated'):
+        if is_anime and (rating := entry.rated):
             title.append(f'[{rating}]')
 
-        if episodes := anime.get('episodes'):
+        if is_anime and (episodes := entry.episodes):
             title.append(f"Episodes : {episodes}")
 
         embed = utils.Embed(title=' | '.join(title),
 
-                            url=anime.get('url'),
+                            url=entry.url,
 
-                            description=(anime.get('synopsis') or 'Not found')[:2000])  # might get none
+                            description=(entry.synopsis or 'Not found')[:2000])  # might get none
 
         embed.set_footer(text=self.footer)
 
-        funcs = (
-
-            lambda: embed.set_thumbnail(url=anime['image_url']),
+        if entry.image_url is not None:
+            embed.set_thumbnail(url=entry.image_url)
 
-            lambda: embed.add_field(name='Genres', value=self.format_named_data(anime['genres'])),
+        if entry.genres:
+            embed.add_field(name='Genres', value=self.format_named_data(entry.genres))
 
-            lambda: embed.add_field(name='Producers', value=self.format_named_data(anime['producers'])),
+        if is_anime:
+            if entry.producers:
+                embed.add_field(name='Producers', value=self.format_named_data(entry.producers))
 
-            lambda: embed.add_field(name='Licensors', value='-' + '\n-'.join(anime['licensors'])),
+            if entry.licensors:
+                embed.add_field(name='Licensors', value='-' + '\n-'.join(entry.licensors))
 
-            lambda: embed.add_field(name='Rank', value=anime['rank']),
+            fields = (('Rank', entry.rank), ('Episodes', entry.episodes),
+                      ('Score', entry.score), ('Airing', entry.airing))
 
-            lambda: embed.add_field(name='Episodes', value=anime['episodes']),
-
-            lambda: embed.add_field(name='Score', value=anime['score']),
-
-            lambda: embed.add_field(name='Airing', value=anime['airing']),
+        else:
+            fields = (('Rank', entry.rank), ('Volumes', entry.volumes), ('Chapters', entry.chapters),
+                      ('Score', entry.score), ('Publishing', entry.publishing))
 
-            lambda: embed.add_field(name='Start date', value=self.format_date(anime['start_date'])),
+        fields += (('Start date', self.format_date(entry.start_date)),
+                   ('End date', self.format_date(entry.end_date)))
 
-            lambda: embed.add_field(name='End date', value=self.format_date(anime['end_date']))
-        )
-
-        for fn in funcs:
-            try:
-                fn()
-            except KeyError:
-                pass
+        for name, value in fields:
+            if value is not None:
+                embed.add_field(name=name, value=value)
 
         return embed.fill_fields()
 
@@ -131,13 +181,190 @@ class MyAnimeList(commands.Cog):
 
     def __init__(self, bot: core.Bot):
         self.bot = bot
-        self.aiojikan = aiojikan = jikanpy.AioJikan(session=bot.session)
+        self.api_limiter = utils.RedisRateLimiter(bot.redis, 'jikan', API_LIMITS)
+        self.api_scheduler = utils.RequestScheduler(self.api_limiter, max_queue=API_MAX_QUEUE)
+        self.aiojikan = utils.CoalescingClient(jikanpy.AioJikan(session=bot.session), scheduler=self.api_scheduler)
         self._make_mal_schedule_commands()
         self._make_mal_season_commands()
         self._make_mal_top_subcommands()
 
-        aiojikan.api_cooldowns = [CooldownMapping.from_cooldown(30, 60, BucketType.default),
-                                  CooldownMapping.from_cooldown(2, 1, BucketType.default)]
+        self.index = utils.TitleIndex()
+        bot.loop.create_task(self.load_index())
+
+        self.register_metrics()
+
+        self.cache_warmer.start()
+        self.index_saver.start()
+
+    def cog_unload(self):
+        self.cache_warmer.cancel()
+        self.index_saver.cancel()
+        self.api_scheduler.close()
+        self.bot.loop.create_task(self.save_index())
+        self.bot.metrics.remove(*METRICS)
+
+    # -- Metrics -- #
+
+    def register_metrics(self):
+        """Exposes the state of the api queue on the bot's metrics"""
+        metrics = self.bot.metrics
+        scheduler = self.api_scheduler
+
+        metrics.collect('ayumi_jikan_queue_depth', 'Requests waiting for the rate limit',
+                        lambda: {(): len(scheduler)})
+
+        metrics.collect('ayumi_jikan_in_flight', 'Distinct jikan calls being made',
+                        lambda: {(): len(self.aiojikan.flight)})
+
+        metrics.collect('ayumi_jikan_queue_wait_seconds', 'How long requests waited for the rate limit',
+                        lambda: {'average': scheduler.average_wait, 'max': scheduler.max_wait}, ('stat',))
+
+        metrics.collect('ayumi_jikan_requests_total', 'Jikan requests by outcome',
+                        lambda: scheduler.stats, ('outcome',), type='counter')
+
+        metrics.collect('ayumi_jikan_coalesced_total', 'Calls that joined an identical call instead',
+                        lambda: {(): self.aiojikan.stats['coalesced']}, type='counter')
+
+        metrics.collect('ayumi_mal_index_entries', 'Entries in the local title index',
+                        lambda: {(): len(self.index)})
+
+    # -- Local index -- #
+
+    async def load_index(self):
+        """Loads the saved index without blocking, keeping what was indexed in the meantime"""
+        index = await self.bot.loop.run_in_executor(None, utils.TitleIndex.load, INDEX_PATH)
+
+        index.merge(self.index)
+
+        self.index = index
+
+    async def save_index(self):
+        """Saves the index without blocking if it changed"""
+        if not self.index.dirty:
+            return
+
+        self.index.dirty = False
+
+        await self.bot.loop.run_in_executor(None, utils.TitleIndex.save, INDEX_PATH, self.index.snapshot())
+
+    @tasks.loop(seconds=INDEX_SAVE_INTERVAL)
+    async def index_saver(self):
+        await self.save_index()
+
+    def ingest(self, media: str, field: str, func: tp.Callable) -> tp.Callable:
+        """
+        Wraps an api call so only the fields we use are kept (and cached),
+        the entries are then added to the local index
+        """
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            try:
+                with utils.metrics.stage('jikan'):
+                    raw = await func(*args, **kwargs)
+
+            except Exception as error:
+                utils.metrics.UPSTREAM_ERRORS.inc(service='jikan', error=error.__class__.__name__)
+                raise
+
+            with utils.metrics.stage('parse'):
+                data = utils.jikan.project_payload(media, raw)
+
+            self.index.add(media, data.get(field) or ())
+
+            return data
+
+        return wrapper
+
+    # -- Cache warming -- #
+
+    def warm_targets(self) -> tp.Generator[tp.Tuple[tuple, str, str, tp.Callable, tuple, dict], None, None]:
+        """Yields the cache key, the media, the data's field and the api call of everything that should always be cached"""
+        aiojikan = self.aiojikan
+
+        for day in utils.DAYS:
+            yield ('schedule', day), 'anime', day, aiojikan.schedule, (day,), {}
+
+        season, year = current_season()
+
+        for season, year in ((season, year), next_season(season, year)):
+            yield ('season', season, year), 'anime', 'anime', aiojikan.season, (), {'year': year, 'season': season}
+
+        yield ('season_later',), 'anime', 'anime', aiojikan.season_later, (), {}
+
+        for media in ('anime', 'manga'):
+            yield ('top', media, 1), media, 'top', aiojikan.top, (), {'type': media, 'page': 1}
+
+    @tasks.loop(seconds=WARM_INTERVAL)
+    async def cache_warmer(self):
+        """Refreshes popular entries before they expire so users always hit the cache"""
+        cache = self.bot.cache
+
+        with utils.request_priority(utils.Priority.BACKGROUND):  # users' requests go first
+
+            for key_parts, media, field, fetch, args, kwargs in self.warm_targets():
+                key = utils.make_key(*key_parts)
+
+                if (age := await cache.age(key)) is not None and age < CACHE_TTL - WARM_BEFORE:
+                    continue
+
+                try:
+                    await cache.refresh(key, self.ingest(media, field, fetch), *args, retention=CACHE_RETENTION,
+                                        validate=self.has_field(field), **kwargs)
+
+                except Exception as error:  # a single failing endpoint shouldn't stop the warmer
+                    traceback.print_exception(*utils.exc_info(error))
+
+    @cache_warmer.before_loop
+    async def before_cache_warmer(self):
+        await self.bot.wait_until_ready()
+
+    # -- Fetching -- #
+
+    @staticmethod
+    def has_field(field: str, *, allow_empty: bool = False) -> tp.Callable[[dict], bool]:
+        """Jikan sometimes answers with empty data instead of an error, those aren't worth caching"""
+        if allow_empty:
+            return lambda data: field in data
+
+        return lambda data: bool(data.get(field))
+
+    async def fetch(self, ctx: core.Context, field: str, func: tp.Callable, *args, media: str = 'anime',
+                    soft_ttl: int = CACHE_TTL, hard_ttl: int = HARD_CACHE_TTL, allow_empty: bool = False,
+                    **kwargs) -> utils.CachedValue:
+        """
+        Gets the data from the cache or the api, falls back on outdated data if the api is down,
+        fetched entries are added to the local index
+        """
+        try:
+            return await ctx.cache.get_or_fetch(ctx.cache_key, self.ingest(media, field, func), *args,
+                                                soft_ttl=soft_ttl, hard_ttl=hard_ttl, retention=CACHE_RETENTION,
+                                                validate=self.has_field(field, allow_empty=allow_empty),
+                                                **kwargs)
+
+        except utils.FetchFailed as error:
+            if isinstance(error.__cause__, utils.QueueFull):
+                raise commands.BadArgument("Sorry ! Too many people are using this right now, please retry later")
+
+            raise commands.BadArgument("Sorry ! The api I'm communicating with seems to be down")
+
+    @staticmethod
+    async def start_menu(ctx: core.Context, footer: str, cached: utils.CachedValue, field: str,
+                         *, data_key: tp.Optional[tp.Hashable] = None):
+        """Displays the entries in a menu, menus with the same data_key share their rendered pages"""
+        if cached.outdated:
+            footer += f" | The api seems to be down, this is from {humanize.naturaldelta(cached.age)} ago"
+
+        dataset = cached.value[field]
+
+        source = JikanAnimeSource(footer, dataset=dataset, view=dataset.view(is_nsfw=ctx.channel.is_nsfw()),
+                                  data_key=data_key or (ctx.cache_key, cached.stored_at))
+
+        if not source.entries:
+            raise commands.BadArgument("Sorry ! I couldn't find anything")
+
+        menu = menus.MenuPages(source, delete_message_after=True)
+        await ctx.start_menu(menu, kind='mal', wait=True)
 
     # -- My anime list -- #
 
@@ -153,28 +380,11 @@ class MyAnimeList(commands.Cog):
 
     async def _mal_schedule_handler(self, ctx: core.Context, day: str):
         """Handles the requests for schedules"""
-        if raw_data := await ctx.redis.get(ctx.cache_key):
-            data = orjson.loads(raw_data)
+        ctx.cache_key = ('schedule', day)
 
-        else:
-            data = await self.aiojikan.schedule(day)
+        cached = await self.fetch(ctx, day, self.aiojikan.schedule, day)
 
-            key = f"{ctx.qname} {day}"
-
-            str_data = orjson.dumps(data)
-
-            await ctx.redis.set(key, str_data, expire=43200)
-
-        if not (anime_data := data.get(day)):
-
-            raise commands.BadArgument("Sorry ! The api I'm communicating with seems to be down")
-
-        source = JikanAnimeSource(f"Planning for {day.capitalize()}",
-                                  entries=anime_data,
-                                  is_nsfw=ctx.channel.is_nsfw())
-
-        menu = menus.MenuPages(source, delete_message_after=True)
-        await menu.start(ctx, wait=True)
+        await self.start_menu(ctx, f"Planning for {day.capitalize()}", cached, day)
 
     @mal.group(name='schedule', aliases=['planning'], invoke_without_command=True)
     async def mal_schedule(self, ctx: core.Context):
@@ -205,37 +415,16 @@ class MyAnimeList(commands.Cog):
     # Season subcommands
     async def _mal_season_handler(self, ctx: core.Context, season: str, year: int):
         """Handles the requests for seasons"""
-        if raw_data := await ctx.redis.get(ctx.cache_key):
-            data = orjson.loads(raw_data)
+        ctx.cache_key = ('season', season, year)
 
-        else:
-            data = await self.aiojikan.season(year=year, season=season)
-
-            str_data = orjson.dumps(data)
+        cached = await self.fetch(ctx, 'anime', self.aiojikan.season, year=year, season=season)
 
-            await ctx.redis.set(ctx.cache_key, str_data, expire=43200)
-
-        if not (anime_data := data.get('anime')):
-            raise commands.BadArgument("Sorry ! The api I'm communicating with seems to be down")
-
-        source = JikanAnimeSource(f"Planning for {season} - {year}",
-                                  entries=anime_data,
-                                  is_nsfw=ctx.channel.is_nsfw())
-
-        menu = menus.MenuPages(source, delete_message_after=True)
-        await menu.start(ctx, wait=True)
+        await self.start_menu(ctx, f"Planning for {season} - {year}", cached, 'anime')
 
     @mal.group(name='season', invoke_without_command=True)
     async def mal_season(self, ctx: core.Context):
         """Gets the planning for the current season or another season of any year"""
-        for (start, end), value in utils.SEASONS.items():
-            if start <= dt.datetime.today().timetuple().tm_yday <= end:
-                season = value
-                break
-        else:
-            season = 'winter'
-
-        await self._mal_season_handler(ctx, season, dt.datetime.today().year)
+        await self._mal_season_handler(ctx, *current_season())
 
     def _make_mal_season_commands(self):
         """Adds a subcommand corresponding to each season of the year"""
@@ -254,39 +443,21 @@ class MyAnimeList(commands.Cog):
     @mal_season.command(name='later', cooldown_after_parsing=True)
     async def mal_season_later(self, ctx: core.Context):
         """Gets the schedule for the next seasons (use season-later to get a precise one)"""
-        if raw_data := await ctx.redis.get(ctx.cache_key):
-            data = orjson.loads(raw_data)
-        else:
-            data = await self.aiojikan.season_later()
-            await ctx.redis.set(ctx.cache_key, orjson.dumps(data), expire=43200)
-
-        if not (anime_data := data.get('anime')):
-            raise commands.BadArgument("Sorry ! The api I'm communicating with seems to be down")
+        ctx.cache_key = ('season_later',)
 
-        source = JikanAnimeSource("Planning for next seasons",
-                                  entries=anime_data,
-                                  is_nsfw=ctx.channel.is_nsfw())
+        cached = await self.fetch(ctx, 'anime', self.aiojikan.season_later)
 
-        menu = menus.MenuPages(source, delete_message_after=True)
-        await menu.start(ctx, wait=True)
+        await self.start_menu(ctx, "Planning for next seasons", cached, 'anime')
 
     # Top subcommands
     async def _mal_top_handler(self, ctx: core.Context, media: tp.Literal['anime', 'manga'], page: int):
-        if raw_data := await ctx.redis.get(ctx.cache_key):
-            data = orjson.loads(raw_data)
+        page = max(page, 1)  # jikan's pages start at 1, 0 used to be an alias for it
 
-        else:
-            data = await self.aiojikan.top(type=media, page=page)
-            await ctx.redis.set(ctx.cache_key, orjson.dumps(data), expire=43200)
-
-        if not (anime_data := data.get('top')):
-            raise commands.BadArgument("Sorry ! The api I'm communicating with seems to be down")
+        ctx.cache_key = ('top', media, page)
 
-        source = JikanAnimeSource("Top animes", entries=anime_data,
-                                  is_nsfw=ctx.channel.is_nsfw())
+        cached = await self.fetch(ctx, 'top', self.aiojikan.top, media=media, type=media, page=page)
 
-        menu = menus.MenuPages(source, delete_message_after=True)
-        await menu.start(ctx, wait=True)
+        await self.start_menu(ctx, f"Top {media}s", cached, 'top')
 
     @mal.group(name='top', only_sends_help=True, invoke_without_command=True)
     async def mal_top(self, ctx: core.Context):
@@ -304,38 +475,69 @@ class MyAnimeList(commands.Cog):
         """Searches something on my anime list"""
         await ctx.send_help(ctx.command)
 
-    @mal_search.command(name='anime', example_args=[EXAMPLE_ANIMES])
-    async def mal_search_anime(self, ctx: core.Context, *, name: str):
-        response = await self.aiojikan.search(ctx.cname, name)
+    @staticmethod
+    def reuse_search(cache: utils.TwoTierCache, media: str, query: str) -> tp.Optional[utils.CachedValue]:
+        """
+        Reuses the results of a search made in this process for the same query,
+        or filters the results of a search for the beginning of the query
+        """
+        words = query.split(' ')
 
-        source = JikanAnimeSource(f"Here are the results for the {ctx.cname} named {name}",
-                                  entries=response['results'],
-                                  is_nsfw=ctx.channel.is_nsfw())
+        for end in range(len(words), 0, -1):
+            prefix = ' '.join(words[:end])
 
-        await menus.MenuPages(source, delete_message_after=True).start(ctx)
+            if (cached := cache.get_local(utils.make_key('search', media, prefix))) is None or cached.age >= SEARCH_TTL:
+                continue
 
-    @mal_search.command(name='manga', example_args=[EXAMPLE_MANGAS])
-    async def mal_search_manga(self, ctx: core.Context, *, name: str):
-        results = await self.aiojikan.search(ctx.cname, name)
-        source = JikanAnimeSource(f"Here are the results for the {ctx.cname} named {name}",
-                                  entries=results,
-                                  is_nsfw=ctx.channel.is_nsfw())
+            if end == len(words):
+                return cached
+
+            if len(results := cached.value['results']) >= JIKAN_PAGE_SIZE:  # what we're looking for might be cut off
+                return None
+
+            matching = [r for r in results if all(w in utils.normalize_key_part(r.title or '') for w in words)]
 
-        await menus.MenuPages(source, delete_message_after=True).start(ctx)
+            if matching:
+                return cached._replace(value={'results': utils.jikan.Dataset(results.model, matching)})
+
+        return None
+
+    async def _mal_search_handler(self, ctx: core.Context, media: tp.Literal['anime', 'manga'], name: str):
+        """
+        Handles the searches, queries are normalized so similar ones share their results,
+        the local index is looked up before asking jikan
+        """
+        query = utils.normalize_key_part(name)
 
-    async def cog_before_invoke(self, ctx: core.Context):
+        ctx.cache_key = ('search', media, query)
 
-        await ctx.author.send('applied rate limits')
+        cached = self.reuse_search(ctx.cache, media, query)
+        data_key = None
 
-        for cd in self.aiojikan.api_cooldowns:
-            bucket = cd.get_bucket(ctx.message)
-            retry_after = bucket.update_rate_limit()
+        # titles we know, no request needed, as long as they're what was searched and not just containing it
+        if cached is None and (results := self.index.search(media, query, min_similarity=INDEX_MIN_SIMILARITY)):
+            dataset = utils.jikan.Dataset(utils.jikan.MODELS[media], results)
+            cached = utils.CachedValue({'results': dataset}, time.time())
 
-            if retry_after:
-                if retry_after < 3:
-                    await asyncio.sleep(retry_after)
-                else:
-                    raise commands.CommandOnCooldown(bucket, retry_after)
+            # a new stored_at every time would fill the rendered pages with ones that are never reused
+            data_key = ('index', media, tuple(entry.mal_id for entry in results))
+
+        if cached is None:
+            cached = await self.fetch(ctx, 'results', self.aiojikan.search, media, query, media=media,
+                                      soft_ttl=SEARCH_TTL, hard_ttl=HARD_SEARCH_TTL, allow_empty=True)
+
+        await self.start_menu(ctx, f"Here are the results for the {media} named {name}", cached, 'results',
+                              data_key=data_key)
+
+    @mal_search.command(name='anime', example_args=[EXAMPLE_ANIMES])
+    async def mal_search_anime(self, ctx: core.Context, *, name: str):
+        """Searches an anime by its name"""
+        await self._mal_search_handler(ctx, 'anime', name)
+
+    @mal_search.command(name='manga', example_args=[EXAMPLE_MANGAS])
+    async def mal_search_manga(self, ctx: core.Context, *, name: str):
+        """Searches a manga by its name"""
+        await self._mal_search_handler(ctx, 'manga', name)
 
 
 def setup(bot: core.Bot):
@@ -71,8 +71,6 @@ class Owner(commands.Cog):
 
         self.make_extension_commands()
 
-        bot.loop.create_task(self.load_all_extensions())
-
     async def cog_check(self, ctx: core.Context):
         """Owner only cog"""
 
@@ -110,11 +108,14 @@ class Owner(commands.Cog):
                 yield ext, "Success"
 
     async def load_all_extensions(self) -> None:
-        """Loads all extensions and sends all pages in the log channel"""
+        """Loads all extensions but the lazy ones and sends all pages in the log channel, done on startup"""
+        loader = self.bot.extension_loader
+
+        extensions = self.get_extension_path('*', IGNORED_COGS | loader.lazy_extensions)
 
-        extensions = self.get_extension_path('*', IGNORED_COGS)
+        timings = await loader.load_many(extensions)
 
-        source = ExtensionSource('load_extension', [*self.handle_extension(self.bot.load_extension, extensions)])
+        source = ExtensionSource('load_extension', [(t.name, t.error or "Success") for t in timings])
 
         for index in range(source.get_max_pages()):
 
@@ -139,7 +140,7 @@ class Owner(commands.Cog):
 
             source = ExtensionSource(ctx.command.load_type.__name__, report)
 
-            await menus.MenuPages(source, delete_message_after=True).start(ctx)
+            await ctx.start_menu(menus.MenuPages(source, delete_message_after=True), kind='extension')
 
         for name in ('load', 'reload', 'unload'):
             ext_command = template.copy()
@@ -192,7 +193,7 @@ class Owner(commands.Cog):
 
         menu = utils.Confirm(msg=codeblock + '\nconfirm changes ?', user=ctx.author)
 
-        await menu.start(ctx, channel=await ctx.author.create_dm(), wait=True)
+        await ctx.start_menu(menu, kind='config', channel=await ctx.author.create_dm(), wait=True)
 
         if menu.accepted:
             self.bot.config = env['config']
@@ -20,32 +20,126 @@ import contextlib
 import datetime as dt
 import inspect
 import sys
+import time
 import traceback
+import typing as tp
 
 import aiohttp
 import aioredis
 import discord
-from discord.ext import commands
+from discord.ext import commands, menus
 
-import orjson
 import utils
 from core import context
 
 CONFIG_PATH = 'config.json'
 
+LOOP_STALL_THRESHOLD = 0.5  # seconds the loop can be blocked for before we get a report
+
+CACHE_HITS = 'memory_hits', 'redis_hits', 'stale_hits', 'outdated_hits'
+
+
+def cache_hit_ratio(stats: tp.Mapping[str, int]) -> float:
+    hits = sum(stats[event] for event in CACHE_HITS)
+    return hits / ((hits + stats['misses']) or 1)
+
 
 class Bot(commands.Bot):
     def __init__(self, *args, **kwargs):
+        self._config_store = utils.ConfigStore(CONFIG_PATH)
+        self._prefixes: tp.Optional[utils.PrefixStore] = None  # needs redis, made on connect
+        self.reaction_router = utils.ReactionRouter()
+        self.menu_manager = utils.MenuManager()
+        self.source_index = utils.SourceIndex()
+        self.extension_loader = utils.ExtensionLoader(self)
+        self.mention_prefixes: tp.Tuple[str, ...] = ()
+        self.commands_version = 0  # bumped whenever a cog is added or removed
         self.load_config()
         super().__init__(*args, **kwargs,
                          owner_id=self.config['discord']['owner_id'],
                          command_prefix=self.get_config_prefix,)
 
     def get_config_prefix(self, bot, message: discord.Message) -> str:
+        """The guild's prefix if it has one, the config's otherwise"""
+        guild = message.guild
+
+        if guild is not None and self._prefixes is not None and (prefix := self._prefixes.get(guild.id)):
+            return prefix
+
+        return self._default_prefix
+
+    # -- Message pre-filter -- #
+
+    def rebuild_triggers(self):
+        """Precomputes what messages worth looking at can start with, called whenever a prefix changes"""
         try:
-            return self.config['discord']['prefix']
+            self._default_prefix = self.config['discord']['prefix']
         except KeyError:
-            return 'fallback '  # just in case I accidentally kill the config
+            self._default_prefix = 'fallback '  # just in case I accidentally kill the config
+
+        self._triggers = (self._default_prefix, *self.mention_prefixes)
+
+        self._guild_triggers = {guild_id: (prefix, *self.mention_prefixes)
+                                for guild_id, prefix in (self._prefixes or {}).items()}
+
+    def wants_message(self, message: discord.Message) -> bool:
+        """Whether a message can be a command or is talking to me, a single startswith for most messages"""
+        if message.author.bot:
+            return False
+
+        guild = message.guild
+
+        return message.content.startswith(self._guild_triggers.get(guild.id, self._triggers) if guild else self._triggers)
+
+    def dispatch(self, event_name: str, *args, **kwargs):
+        """
+        Drops the messages that aren't for me before any context is made or any listener runs,
+        reactions are handed to the menus of the reacted message directly
+        """
+        if event_name == 'message' and not self.wants_message(args[0]):
+            return
+
+        if event_name in utils.reactions.REACTION_EVENTS:
+            self.menu_manager.touch(args[0].message_id)
+            self.reaction_router.dispatch(event_name, args[0])
+
+        super().dispatch(event_name, *args, **kwargs)
+
+    def wait_for(self, event: str, *, check: tp.Optional[tp.Callable] = None, timeout: tp.Optional[float] = None):
+        """Menus wait for their reactions through the router, indexed by message id"""
+        menu = getattr(check, '__self__', None)
+
+        if event in utils.reactions.REACTION_EVENTS and isinstance(menu, menus.Menu) and menu.message is not None:
+            return self.reaction_router.wait_for(event, menu.message.id, check, timeout=timeout)
+
+        return super().wait_for(event, check=check, timeout=timeout)
+
+    # -- Command tree -- #
+
+    def add_cog(self, cog: commands.Cog):
+        """
+        Lets whatever was derived from the command tree (like help pages) know it's outdated,
+        and reads the source of the cog's commands while the extension is being loaded anyway
+        """
+        super().add_cog(cog)
+        self.commands_version += 1
+
+        extra = {}
+
+        if self.help_command is not None and self.help_command.cog is cog:
+            extra['help'] = self.help_command.__class__
+
+        self.source_index.add_cog(cog, github_url=self.config.get('github', {}).get('url'), extra=extra)
+
+    def remove_cog(self, name: str):
+        super().remove_cog(name)
+        self.commands_version += 1
+        self.source_index.remove_cog(name)
+
+    async def on_ready(self):
+        """We now know our mention"""
+        self.mention_prefixes = (self.user.mention + ' ', f'<@!{self.user.id}> ')
+        self.rebuild_triggers()
 
     # -- Properties -- #
 
@@ -63,6 +157,22 @@ class Bot(commands.Bot):
     def log_webhook(self) -> discord.Webhook:
         return self._log_webhook
 
+    @property
+    def prefixes(self) -> utils.PrefixStore:
+        return self._prefixes
+
+    @property
+    def log_shipper(self) -> utils.LogShipper:
+        return self._log_shipper
+
+    @property
+    def cache(self) -> utils.TwoTierCache:
+        return self._cache
+
+    @property
+    def metrics(self) -> utils.metrics.Metrics:
+        return utils.metrics.REGISTRY
+
     # config
     @property
     def config(self):
@@ -70,22 +180,23 @@ class Bot(commands.Bot):
 
     @config.setter
     def config(self, new_config: dict):
-        encoded = orjson.dumps(new_config, option=orjson.OPT_INDENT_2)
-        json = encoded.decode('utf-8')
-
-        with open(CONFIG_PATH, 'w') as f:
-            f.write(json)
-
+        """Applied right away, saved to the file a bit later in a thread"""
         self._config = new_config
+        self._config_store.save(new_config)
+        self.rebuild_triggers()
 
     def load_config(self) -> dict:
         """Opens the config, used on startup"""
-        with open(CONFIG_PATH, 'r') as file:
-            json = file.read()
-            self._config = orjson.loads(json)
-
+        self._config = self._config_store.load()
+        self.rebuild_triggers()
         return self._config
 
+    def on_config_file_edit(self, new_config: dict):
+        """Picks up edits made to the file while running"""
+        old_config, self._config = self._config, new_config
+        self.rebuild_triggers()
+        self.dispatch('config_reload', old_config, new_config)
+
     # -- Start / Stop -- #
 
     def run(self, *args, **kwargs):
@@ -98,21 +209,50 @@ class Bot(commands.Bot):
 
         self._redis = await aioredis.create_redis_pool('redis://localhost')
 
+        self._prefixes = utils.PrefixStore(self._redis, on_change=self.rebuild_triggers)
+        self._prefixes.start()
+
+        self._cache = utils.TwoTierCache(self._redis, codec=utils.CompactCodec(ext_types=utils.jikan.EXT_TYPES))
+
         self._before_invoke = self.before_invoke
 
+        self._after_invoke = self.after_invoke
+
+        self.register_metrics()
+
+        if (metrics_config := self.config.get('metrics')) is not None:
+            self._metrics_server = utils.metrics.MetricsServer(self.metrics, **metrics_config)
+            await self._metrics_server.start()
+
         self._log_webhook = discord.Webhook.from_url(self.config['discord']['logger_url'],
                                                      adapter=discord.AsyncWebhookAdapter(self.session))
 
+        self._log_shipper = utils.LogShipper(self.log_webhook)
+        self._log_shipper.start()
+
+        self._config_store.watch(self.on_config_file_edit)
+
+        self._watchdog = utils.LoopWatchdog(self.loop, report=self.report_stall, threshold=LOOP_STALL_THRESHOLD)
+        self._watchdog.start()
+
         self.dispatch('startup')
 
         return await super().connect(reconnect=reconnect)
 
     async def on_startup(self):
 
-        self.load_extension('jishaku')
+        loader = self.extension_loader
+
+        for extension, command_names in self.config.get('extensions', {}).get('lazy', {}).items():
+            loader.add_lazy(extension, command_names)
 
         await self.wait_until_ready()
 
+        await loader.load_many(['jishaku', 'cogs.owner'])
+
+        if (owner := self.get_cog('Owner')) is not None:
+            await owner.load_all_extensions()
+
         codeblock = utils.codeblock
 
         disconfig = self.config['discord']
@@ -131,13 +271,24 @@ class Bot(commands.Bot):
 
                  .add_field(name='Discord.py version', value=codeblock(discord.__version__))
 
-                 .add_field(name='Default prefix', value=codeblock(disconfig['prefix'])))
+                 .add_field(name='Default prefix', value=codeblock(disconfig['prefix']))
 
-        await self.log_webhook.send(content=f"<@{self.owner_id}>", embed=embed)
+                 .add_field(name='Extensions', value=codeblock(loader.report())[:1024]))
 
-        self.load_extension('cogs.owner')
+        await self.log_webhook.send(content=f"<@{self.owner_id}>", embed=embed)
 
     async def close(self):
+        self._watchdog.stop()
+
+        self._config_store.stop_watching()
+        self.prefixes.stop()
+        await self._config_store.flush()
+
+        if (server := getattr(self, '_metrics_server', None)) is not None:
+            await server.close()
+
+        await self.log_shipper.close()
+
         await self.session.close()
         return await super().close()
 
@@ -169,13 +320,30 @@ class Bot(commands.Bot):
         for key, value in kwargs.items():
             embed.add_field(name='kwarg - ' + key, value=utils.format_arg(value))
 
-        await self.log_webhook.send(embed=embed)
+        self.log_shipper.submit(embed, fingerprint=utils.logship.fingerprint(tb))
+
+    # loop stalls
+
+    async def report_stall(self, stall: utils.watchdog.Stall):
+        """Logs what was blocking the event loop"""
+        embed = utils.Embed(title=f"Event loop blocked for {stall.duration:.2f}s",
+
+                            description=utils.codeblock(stall.stack[-1900:], lang='py'),
+
+                            color=discord.Color.orange(),
+
+                            timestamp=dt.datetime.now(tz=dt.timezone.utc))
+
+        self.log_shipper.submit(embed, fingerprint=stall.fingerprint)
 
     # command error
 
     async def on_command_error(self, ctx: context.Context, exception: Exception):
         """Logs errors that were raised in commands"""
 
+        error = getattr(exception, 'original', exception)
+        utils.metrics.COMMAND_ERRORS.inc(command=ctx.qname or '', error=error.__class__.__name__)
+
         if self.extra_events.get('on_command_error', None):
             return
 
@@ -209,7 +377,7 @@ class Bot(commands.Bot):
         for arg_name, arg in zip(ctx.command.clean_params.keys(), ctx.all_args):
             embed.add_field(name=arg_name, value=arg, inline=False)
 
-        await self.log_webhook.send(embed=embed)
+        self.log_shipper.submit(embed, fingerprint=utils.logship.fingerprint(tb))
 
         await ctx.send(embed=utils.Embed(title=exception.__class__.__name__,
 
@@ -223,7 +391,63 @@ class Bot(commands.Bot):
         """Uses our custom context"""
         return await super().get_context(message, cls=cls)
 
+    async def invoke(self, ctx: context.Context):
+        """The commands of lazy extensions load them on first use"""
+        if ctx.command is None and (extension := self.extension_loader.lazy_commands.get(ctx.invoked_with)):
+
+            if (timing := await self.extension_loader.load_lazy(extension)) is not None and timing.error:
+                raise timing.error
+
+            ctx = await self.get_context(ctx.message)
+
+        await super().invoke(ctx)
+
     async def before_invoke(self, ctx: context.Context):
         """Typing animation before invoking anything"""
-        with contextlib.suppress(discord.DiscordException):
+        ctx.invoked_at = time.perf_counter()
+
+        utils.metrics.current_command.set(ctx.qname)  # the stages timed from now on belong to this command
+
+        with contextlib.suppress(discord.DiscordException), utils.metrics.stage('typing'):
             await ctx.trigger_typing()
+
+    async def after_invoke(self, ctx: context.Context):
+        """Records how long the command took, up to its first page for menus"""
+        status = 'failed' if ctx.command_failed else 'ok'
+
+        elapsed = time.perf_counter() - ctx.invoked_at - ctx.menu_seconds
+
+        utils.metrics.COMMAND_SECONDS.observe(elapsed, command=ctx.qname, status=status)
+
+    # -- Metrics -- #
+
+    def register_metrics(self):
+        """Exposes the cache's counters on the metrics"""
+        cache = self.cache
+
+        self.metrics.collect('ayumi_cache_events_total', 'Cache lookups by outcome',
+                             lambda: cache.stats, ('event',), type='counter')
+
+        self.metrics.collect('ayumi_cache_memory_events_total', 'Memory tier lookups by outcome',
+                             lambda: cache.memory.stats, ('event',), type='counter')
+
+        self.metrics.collect('ayumi_cache_hit_ratio', 'Share of lookups answered by the cache',
+                             lambda: {(): cache_hit_ratio(cache.stats)})
+
+        self.metrics.collect('ayumi_cache_memory_entries', 'Entries in the memory tier',
+                             lambda: {(): len(cache.memory)})
+
+        self.metrics.collect('ayumi_menus_live', 'Running menus by kind',
+                             lambda: self.menu_manager.counts(), ('kind',))
+
+        self.metrics.collect('ayumi_process_rss_bytes', 'Memory used by the process, idle menus are stopped past a limit',
+                             lambda: {(): self.menu_manager.rss})
+
+        self.metrics.collect('ayumi_menus_total', 'Menus started / replaced / evicted',
+                             lambda: self.menu_manager.stats, ('outcome',), type='counter')
+
+        self.metrics.collect('ayumi_logs_total', 'Logs sent to the webhook by outcome',
+                             lambda: self.log_shipper.stats, ('outcome',), type='counter')
+
+        self.metrics.collect('ayumi_logs_queue_depth', 'Logs waiting to be sent',
+                             lambda: {(): len(self.log_shipper)})
@@ -16,16 +16,23 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+import asyncio
 import functools
+import time
 import typing as tp
 import aioredis
-from discord.ext import commands
+import discord
+from discord.ext import commands, menus
+
+import utils
 
 
 class Context(commands.Context):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._altered_cache_key = None
+        self.invoked_at: tp.Optional[float] = None  # perf_counter, set before invoking the command
+        self.menu_seconds = 0.0  # spent waiting for menus to end, not counted as the command's time
 
     @functools.cached_property
     def cname(self) -> tp.Union[str, None]:
@@ -48,22 +55,54 @@ class Context(commands.Context):
 
     @property
     def cache_key(self) -> str:
-        """Returns a string that is used as the cache key"""
+        """
+        Returns a string that is used as the cache key,
+        defaults to the command's name and arguments
+        """
 
-        list_key = self._altered_cache_key or ([self.qname] + [*map(str, self.all_args)])
+        list_key = self._altered_cache_key or ([self.qname] + self.all_args)
 
-        return ' '.join(list_key)
+        return utils.make_key(*list_key)
 
     @cache_key.setter
-    def cache_key(self, key: str) -> None:
-        """Sets another key to use for this context"""
+    def cache_key(self, key: tp.Union[list, tuple]) -> None:
+        """
+        Sets another key to use for this context,
+        commands fetching the same data should set the same key (endpoint + arguments)
+        """
 
         if not isinstance(key, (list, tuple)):
             raise TypeError("Cache key must be a list or a tuple")
 
         self._altered_cache_key = key
 
+    async def start_menu(self, menu: menus.Menu, *, kind: str, channel: tp.Optional[discord.abc.Messageable] = None,
+                         wait: bool = False) -> None:
+        """Starts a menu through the bot's menu manager, kind is what replaces what (a user's help menu replaces the last one)"""
+        done = await self.bot.menu_manager.start(menu, self, kind=kind, channel=channel)
+
+        if not wait or done is None:
+            return
+
+        start = time.perf_counter()
+
+        # people reading pages, kept out of the command's time
+        with utils.metrics.MENU_SECONDS.time(command=self.qname or ''):
+            await asyncio.shield(done)
+
+        self.menu_seconds += time.perf_counter() - start
+
+    async def send(self, *args, **kwargs):
+        """Same as usual, but timed"""
+        with utils.metrics.stage('send'):
+            return await super().send(*args, **kwargs)
+
     @property
     def redis(self) -> aioredis.Redis:
         """Returns the bot's redis"""
         return self.bot.redis
+
+    @property
+    def cache(self) -> utils.TwoTierCache:
+        """Returns the bot's memory + redis cache"""
+        return self.bot.cache
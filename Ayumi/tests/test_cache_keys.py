@@ -0,0 +1,209 @@
+"""
+Ayumi - Discord bot
+Copyright (C) 2020 - Saphielle Akiyama | saphielle.akiyama@gmail.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+import asyncio
+import datetime as dt
+import types
+import typing as tp
+import unittest
+
+from discord.ext import commands
+from discord.ext.commands.view import StringView
+
+import core
+import utils
+from cogs.myanimelist import MyAnimeList, current_season, next_season
+
+ENTRY = {'mal_id': 1, 'url': 'https://myanimelist.net/anime/1', 'title': 'Some anime'}
+
+
+class FakeTransaction:
+    def __init__(self, redis: 'FakeRedis'):
+        self.redis = redis
+
+    @staticmethod
+    def _result(value: tp.Any) -> asyncio.Future:
+        future = asyncio.get_event_loop().create_future()
+        future.set_result(value)
+        return future
+
+    def get(self, key: str):
+        return self._result(self.redis.data.get(key))
+
+    def pttl(self, key: str):
+        return self._result(-1)
+
+    async def execute(self):
+        pass
+
+
+class FakeRedis:
+    """Just enough of aioredis for TwoTierCache, remembers what was written"""
+
+    def __init__(self):
+        self.data: tp.Dict[str, bytes] = {}
+
+    def multi_exec(self) -> FakeTransaction:
+        return FakeTransaction(self)
+
+    async def set(self, key: str, value: bytes, *, expire: tp.Optional[int] = None):
+        self.data[key] = value
+
+    async def getrange(self, key: str, start: int, end: int) -> bytes:
+        return self.data.get(key, b'')[start:end + 1]
+
+
+class FakeJikan:
+    """Answers every endpoint with a single entry, under the field jikan would use"""
+
+    async def schedule(self, day: str) -> dict:
+        return {day: [ENTRY]}
+
+    async def season(self, *, year: int, season: str) -> dict:
+        return {'anime': [ENTRY]}
+
+    async def season_later(self) -> dict:
+        return {'anime': [ENTRY]}
+
+    async def top(self, *, type: str, page: int) -> dict:
+        return {'top': [ENTRY]}
+
+    async def search(self, media: str, query: str) -> dict:
+        return {'results': [ENTRY]}
+
+
+def make_cog(bot: commands.Bot) -> MyAnimeList:
+    """The cog without its api client, background tasks nor menus"""
+    cog = MyAnimeList.__new__(MyAnimeList)  # copies the commands, __init__ would start the tasks
+
+    cog.bot = bot
+    cog.aiojikan = FakeJikan()
+    cog.index = utils.TitleIndex()
+
+    cog._make_mal_schedule_commands()
+    cog._make_mal_season_commands()
+    cog._make_mal_top_subcommands()
+
+    async def start_menu(ctx, footer, cached, field, **kwargs):
+        pass
+
+    cog.start_menu = start_menu
+
+    bot.add_cog(cog)
+
+    return cog
+
+
+def make_context(bot: commands.Bot, content: str) -> core.Context:
+    """What get_context does once the prefix was found"""
+    message = types.SimpleNamespace(content=content, guild=None, _state=None,
+                                    author=types.SimpleNamespace(id=1, bot=False))
+
+    view = StringView(content)
+
+    ctx = core.Context(prefix='!', view=view, bot=bot, message=message)
+
+    ctx.invoked_with = invoker = view.get_word()
+    ctx.command = bot.all_commands.get(invoker)
+
+    return ctx
+
+
+class CacheKeyTests(unittest.IsolatedAsyncioTestCase):
+    """The key a command reads must be the one its fetch writes and the one the warmer refreshes"""
+
+    async def asyncSetUp(self):
+        self.bot = commands.Bot(command_prefix='!')
+        self.cog = make_cog(self.bot)
+        self.warmed = await self.warmed_keys()
+
+    def reset_cache(self) -> FakeRedis:
+        redis = FakeRedis()
+        self.bot.cache = utils.TwoTierCache(redis, codec=utils.CompactCodec(ext_types=utils.jikan.EXT_TYPES))
+        return redis
+
+    async def warmed_keys(self) -> tp.Set[str]:
+        """Runs the warmer once on an empty cache"""
+        redis = self.reset_cache()
+
+        await self.cog.cache_warmer.coro(self.cog)
+
+        keys = {utils.make_key(*key_parts) for key_parts, *_ in self.cog.warm_targets()}
+
+        self.assertEqual(set(redis.data), keys)
+
+        return keys
+
+    async def assert_key(self, key_parts: tuple, *contents: str, warmed: bool):
+        """Every invocation, aliases included, should use that single key"""
+        expected = utils.make_key(*key_parts)
+
+        for content in contents:
+            with self.subTest(content=content):
+                redis = self.reset_cache()
+
+                ctx = make_context(self.bot, content)
+
+                await ctx.command.invoke(ctx)
+
+                self.assertEqual(ctx.cache_key, expected)
+                self.assertEqual(set(redis.data), {expected})
+
+        if warmed:
+            self.assertIn(expected, self.warmed)
+
+    async def test_schedule(self):
+        today = dt.datetime.today().strftime('%A').lower()
+
+        await self.assert_key(('schedule', today), 'mal schedule', 'mal planning', 'mal schedule today',
+                              'mal schedule now', 'mal planning now', warmed=True)
+
+        for day in utils.DAYS:
+            await self.assert_key(('schedule', day), f'mal schedule {day}', f'mal schedule {day[:3]}',
+                                  f'mal planning {day}', warmed=True)
+
+    async def test_season(self):
+        season, year = current_season()
+        warmed = {(season, year), next_season(season, year)}
+
+        await self.assert_key(('season', season, year), 'mal season', warmed=True)
+
+        for name in utils.SEASONS.values():
+            await self.assert_key(('season', name, year), f'mal season {name}', f'mal season {name} {year}',
+                                  warmed=(name, year) in warmed)
+
+            await self.assert_key(('season', name, 2000), f'mal season {name} 2000', warmed=False)
+
+        await self.assert_key(('season_later',), 'mal season later', warmed=True)
+
+    async def test_top(self):
+        for media in ('anime', 'manga'):
+            await self.assert_key(('top', media, 1), f'mal top {media}', f'mal top {media} 0',
+                                  f'mal top {media} 1', warmed=True)
+
+            await self.assert_key(('top', media, 2), f'mal top {media} 2', warmed=False)
+
+    async def test_search(self):
+        for media in ('anime', 'manga'):
+            await self.assert_key(('search', media, 'jojo'), f'mal search {media} jojo',
+                                  f'mal search {media} JoJo', f'mal search {media}   jojo  ', warmed=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
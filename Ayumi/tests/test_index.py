@@ -0,0 +1,54 @@
+"""
+Ayumi - Discord bot
+Copyright (C) 2020 - Saphielle Akiyama | saphielle.akiyama@gmail.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+import unittest
+
+import utils
+from cogs.myanimelist import INDEX_MIN_SIMILARITY
+
+TITLES = {1: 'Boruto: Naruto Next Generations', 2: 'One Piece Film: Red', 3: 'Naruto'}
+
+
+class TitleIndexTests(unittest.TestCase):
+    """Searches are only answered from the index when it has what was actually searched"""
+
+    def setUp(self):
+        self.index = utils.TitleIndex()
+        self.index.add('anime', [utils.jikan.Anime.from_dict({'mal_id': mal_id, 'title': title})
+                                 for mal_id, title in TITLES.items()])
+
+    def search(self, query: str):
+        return [entry.mal_id for entry in self.index.search('anime', query, min_similarity=INDEX_MIN_SIMILARITY)]
+
+    def test_partial_matches_go_to_jikan(self):
+        for query in ('one piece', 'piece', 'boruto'):
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query), [])
+
+    def test_close_matches(self):
+        self.assertEqual(self.search('naruto'), [3])
+        self.assertEqual(self.search('NARUTO'), [3])
+        self.assertEqual(self.search('one piece film: red'), [2])
+
+    def test_fuzzy_search(self):
+        self.assertEqual(sorted(e.mal_id for e in self.index.search('anime', 'naruto')), [1, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -27,6 +27,25 @@ import typing as tp
 import discord
 from discord.ext import commands, menus
 
+from .cache import CachedValue, FetchFailed, LRUCache, TwoTierCache, make_key, normalize_key_part  # noqa: F401
+from . import jikan  # noqa: F401
+from .codec import CompactCodec  # noqa: F401
+from .concurrency import CircuitBreaker, CircuitOpen, ConcurrencyLimiter, TooBusy  # noqa: F401
+from .configstore import ConfigStore  # noqa: F401
+from .conversations import Conversation, ConversationStore  # noqa: F401
+from .extensions import ExtensionLoader  # noqa: F401
+from .index import TitleIndex  # noqa: F401
+from .logship import LogShipper  # noqa: F401
+from .menumanager import MenuManager  # noqa: F401
+from . import metrics  # noqa: F401
+from .prefixes import PrefixStore  # noqa: F401
+from .reactions import ReactionRouter  # noqa: F401
+from .ratelimit import RateLimit, RateLimited, RedisRateLimiter  # noqa: F401
+from .scheduler import Priority, QueueFull, RequestScheduler, request_priority  # noqa: F401
+from .singleflight import CoalescingClient, SingleFlight  # noqa: F401
+from .sourceindex import SourceIndex  # noqa: F401
+from .watchdog import LoopWatchdog  # noqa: F401
+
 # Format
 
 TB_PATTERN = re.compile(r"File (\".+\")")
@@ -0,0 +1,370 @@
+"""
+Ayumi - Discord bot
+Copyright (C) 2020 - Saphielle Akiyama | saphielle.akiyama@gmail.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import collections
+import re
+import struct
+import sys
+import time
+import typing as tp
+import unicodedata
+
+import aioredis
+import orjson
+
+from .metrics import stage
+from .scheduler import Priority, request_priority
+from .singleflight import SingleFlight
+
+MISSING = object()
+
+CACHE_VERSION = 6  # bump when the format of cached values changes
+
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_key_part(part: tp.Any) -> str:
+    """
+    Normalizes unicode, casefolds and collapses whitespace
+    so equivalent arguments map to the same key
+    """
+    return WHITESPACE.sub(' ', unicodedata.normalize('NFKC', str(part))).strip().casefold()
+
+
+def make_key(*parts: tp.Any) -> str:
+    """
+    Builds a canonical, versioned cache key
+
+    make_key('schedule', 'Monday')
+    >>> cache:v6:schedule:monday
+    """
+    return ':'.join(['cache', f'v{CACHE_VERSION}', *map(normalize_key_part, parts)])
+
+
+def estimate_size(value: tp.Any) -> int:
+    """
+    Roughly how many bytes a decoded value takes in memory,
+    values that know better can have an estimated_size method
+    """
+    if (estimated_size := getattr(value, 'estimated_size', None)) is not None:
+        return estimated_size()
+
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(map(estimate_size, value))
+
+    return sys.getsizeof(value)
+
+
+class CacheEntry(tp.NamedTuple):
+    value: tp.Any
+    size: int
+    expires_at: tp.Optional[float]
+
+
+class LRUCache:
+    """
+    A bounded in-memory cache holding already decoded objects,
+    evicts the least recently used entries once there are too many or
+    when they take too much space, entries can also have their own ttl
+    """
+
+    def __init__(self, *, max_entries: int = 256, max_size: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.size = 0
+
+        self._entries: tp.OrderedDict[tp.Hashable, CacheEntry] = collections.OrderedDict()
+
+        self.stats = collections.Counter(hits=0, misses=0, evictions=0, expirations=0)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: tp.Hashable) -> bool:
+        return self.get(key, update_stats=False) is not MISSING
+
+    def get(self, key: tp.Hashable, default: tp.Any = MISSING, *, update_stats: bool = True) -> tp.Any:
+        """Returns the value stored at this key, or the default if it's missing / expired"""
+        entry = self._entries.get(key)
+
+        if entry is not None and entry.expires_at is not None and entry.expires_at <= time.monotonic():
+            self.stats['expirations'] += 1
+            self.pop(key)
+            entry = None
+
+        if entry is None:
+            if update_stats:
+                self.stats['misses'] += 1
+
+            return default
+
+        if update_stats:
+            self.stats['hits'] += 1
+
+        self._entries.move_to_end(key)
+
+        return entry.value
+
+    def set(self, key: tp.Hashable, value: tp.Any, *, ttl: tp.Optional[float] = None, size: int = 1) -> None:
+        """Stores a value, size is an estimation of how much memory it takes (in bytes)"""
+        self.pop(key)
+
+        if size > self.max_size:  # would evict everything else for nothing
+            return
+
+        expires_at = None if ttl is None else time.monotonic() + ttl
+
+        self._entries[key] = CacheEntry(value, size, expires_at)
+
+        self.size += size
+
+        while len(self._entries) > self.max_entries or self.size > self.max_size:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= evicted.size
+            self.stats['evictions'] += 1
+
+    def pop(self, key: tp.Hashable, default: tp.Any = None) -> tp.Any:
+        """Removes a key from the cache"""
+        if (entry := self._entries.pop(key, None)) is None:
+            return default
+
+        self.size -= entry.size
+
+        return entry.value
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.size = 0
+
+
+class JSONCodec:
+    """How values are turned into bytes before going in redis"""
+
+    @staticmethod
+    def dumps(value: tp.Any) -> bytes:
+        return orjson.dumps(value)
+
+    @staticmethod
+    def loads(raw: bytes) -> tp.Any:
+        return orjson.loads(raw)
+
+
+class CachedValue(tp.NamedTuple):
+    value: tp.Any
+    stored_at: float  # unix timestamp
+    outdated: bool = False  # whether this is a last known good copy served because the api failed
+
+    @property
+    def age(self) -> float:
+        """How many seconds ago the value was fetched"""
+        return time.time() - self.stored_at
+
+
+class FetchFailed(Exception):
+    """Raised when the api failed and there is no copy to fall back on"""
+
+
+class InvalidValue(Exception):
+    """Raised when a fetched value is rejected by the validator, it isn't cached"""
+
+
+class TwoTierCache:
+    """
+    An in-memory LRUCache in front of redis,
+    hot keys are served from memory without any round trip nor decoding
+
+    Values are fresh for soft_ttl seconds, then they are still served but refreshed in the background,
+    after hard_ttl seconds the api is awaited and the old copy is only used if the api fails,
+    redis keeps the copies for retention seconds
+
+    result = await cache.get_or_fetch('some key', aiojikan.schedule, 'monday', soft_ttl=43200)
+    result.value
+    """
+
+    STAMP = struct.Struct('!d')  # when the value was stored, prepended to the encoded value
+
+    def __init__(self, redis: aioredis.Redis, *, memory: tp.Optional[LRUCache] = None, codec: tp.Any = JSONCodec):
+        self.redis = redis
+        self.memory = memory or LRUCache()
+        self.codec = codec
+        self.flight = SingleFlight()
+
+        self._background_refreshes: tp.Set[asyncio.Future] = set()
+
+        self.stats = collections.Counter(memory_hits=0, redis_hits=0, misses=0, decode_errors=0,
+                                         stale_hits=0, outdated_hits=0, fetch_errors=0)
+
+    def get_local(self, key: str) -> tp.Optional[CachedValue]:
+        """Gets a value from memory only"""
+        if (cached := self.memory.get(key)) is MISSING:
+            return None
+
+        self.stats['memory_hits'] += 1
+
+        return cached
+
+    async def get(self, key: str) -> tp.Optional[CachedValue]:
+        """Gets a value from memory, then from redis, regardless of its age"""
+        return self.get_local(key) or await self._get_remote(key)
+
+    async def _get_remote(self, key: str) -> tp.Optional[CachedValue]:
+        """Gets a value from redis and keeps it in memory"""
+        with stage('redis'):
+            tr = self.redis.multi_exec()
+            raw_fut = tr.get(key)
+            ttl_fut = tr.pttl(key)
+            await tr.execute()
+
+        if (raw := await raw_fut) is None:
+            self.stats['misses'] += 1
+            return None
+
+        try:
+            with stage('decode'):
+                stored_at, = self.STAMP.unpack_from(raw)
+                value = self.codec.loads(raw[self.STAMP.size:])
+
+        except (struct.error, ValueError):  # written by an older / newer version, treated as missing
+            self.stats['decode_errors'] += 1
+            return None
+
+        self.stats['redis_hits'] += 1
+
+        cached = CachedValue(value, stored_at)
+
+        pttl = await ttl_fut
+
+        # the memory tier holds the decoded value, which is a lot bigger than the compressed bytes
+        self.memory.set(key, cached, ttl=pttl / 1000 if pttl > 0 else None, size=estimate_size(value))
+
+        return cached
+
+    async def set(self, key: str, value: tp.Any, *, retention: int) -> CachedValue:
+        """Stores a value in both tiers, retention is in seconds"""
+        cached = CachedValue(value, time.time())
+
+        with stage('encode'):
+            raw = self.STAMP.pack(cached.stored_at) + self.codec.dumps(value)
+
+        self.memory.set(key, cached, ttl=retention, size=estimate_size(value))
+
+        with stage('redis'):
+            await self.redis.set(key, raw, expire=retention)
+
+        return cached
+
+    async def age(self, key: str) -> tp.Optional[float]:
+        """Returns how many seconds ago the key was stored, None if it's missing"""
+        if (cached := self.memory.get(key, update_stats=False)) is not MISSING:
+            return cached.age
+
+        if not (raw := await self.redis.getrange(key, 0, self.STAMP.size - 1)):
+            return None
+
+        stored_at, = self.STAMP.unpack(raw)
+
+        return time.time() - stored_at
+
+    async def delete(self, key: str) -> None:
+        self.memory.pop(key)
+        await self.redis.delete(key)
+
+    async def refresh(self, key: str, fetch: tp.Callable[..., tp.Awaitable], *args,
+                      retention: int, validate: tp.Optional[tp.Callable[[tp.Any], bool]] = None,
+                      **kwargs) -> CachedValue:
+        """Fetches and stores a fresh value, even if one is already cached"""
+        return await self.flight.do(key, self._refresh, key, fetch, args, kwargs, retention, validate)
+
+    async def _refresh(self, key: str, fetch: tp.Callable[..., tp.Awaitable], args: tuple, kwargs: dict,
+                       retention: int, validate: tp.Optional[tp.Callable[[tp.Any], bool]]) -> CachedValue:
+
+        value = await fetch(*args, **kwargs)
+
+        if validate is not None and not validate(value):
+            raise InvalidValue(f"Refusing to cache an invalid value for {key}")
+
+        return await self.set(key, value, retention=retention)
+
+    async def _revalidate(self, key: str, fetch: tp.Callable[..., tp.Awaitable], args: tuple, kwargs: dict,
+                          soft_ttl: int, retention: int, validate: tp.Optional[tp.Callable[[tp.Any], bool]]
+                          ) -> CachedValue:
+        """Refreshes a key unless someone else (another process) already did it"""
+        if (cached := await self._get_remote(key)) is not None and cached.age < soft_ttl:
+            return cached
+
+        return await self.refresh(key, fetch, *args, retention=retention, validate=validate, **kwargs)
+
+    def _revalidate_in_background(self, key: str, *args) -> None:
+        """Revalidates a key without waiting for it, errors are only counted"""
+        with request_priority(Priority.BACKGROUND):  # the task copies the context when it's created
+            future = asyncio.ensure_future(self.flight.do(('revalidate', key), self._revalidate, key, *args))
+
+        self._background_refreshes.add(future)
+
+        future.add_done_callback(self._on_background_refresh_done)
+
+    def _on_background_refresh_done(self, future: asyncio.Future) -> None:
+        self._background_refreshes.discard(future)
+
+        if not future.cancelled() and future.exception() is not None:
+            self.stats['fetch_errors'] += 1
+
+    async def get_or_fetch(self, key: str, fetch: tp.Callable[..., tp.Awaitable], *args,
+                           soft_ttl: int, hard_ttl: tp.Optional[int] = None, retention: tp.Optional[int] = None,
+                           validate: tp.Optional[tp.Callable[[tp.Any], bool]] = None,
+                           errors: tp.Tuple[tp.Type[BaseException], ...] = (Exception,),
+                           **kwargs) -> CachedValue:
+        """
+        Returns the cached value or stores the result of fetch(*args, **kwargs),
+        hard_ttl defaults to twice the soft_ttl and retention to a week
+        """
+        hard_ttl = hard_ttl or soft_ttl * 2
+        retention = max(retention or 604800, hard_ttl)
+
+        revalidate_args = (fetch, args, kwargs, soft_ttl, retention, validate)
+
+        if (cached := self.get_local(key)) is None:
+            cached = await self.flight.do(('get', key), self._get_remote, key)
+
+        if cached is not None:
+            age = cached.age
+
+            if age < soft_ttl:
+                return cached
+
+            if age < hard_ttl:
+                self.stats['stale_hits'] += 1
+                self._revalidate_in_background(key, *revalidate_args)
+                return cached
+
+        try:
+            return await self.flight.do(('revalidate', key), self._revalidate, key, *revalidate_args)
+
+        except (InvalidValue, *errors) as error:
+            self.stats['fetch_errors'] += 1
+
+            if cached is None:
+                raise FetchFailed(f"Couldn't fetch {key} and nothing was cached") from error
+
+            self.stats['outdated_hits'] += 1
+
+            return cached._replace(outdated=True)
@@ -0,0 +1,105 @@
+"""
+Ayumi - Discord bot
+Copyright (C) 2020 - Saphielle Akiyama | saphielle.akiyama@gmail.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import struct
+import typing as tp
+
+import msgpack
+
+try:
+    import zstandard
+except ImportError:  # compression is optional
+    zstandard = None
+
+FORMAT_VERSION = 1
+
+FLAG_ZSTD = 1
+
+HEADER = struct.Struct('!BB')  # format version, flags
+
+
+class UnknownFormat(ValueError):
+    """Raised when the data was encoded with another version or can't be decoded"""
+
+
+class CompactCodec:
+    """
+    Encodes values with msgpack behind a small header (format version and flags),
+    payloads bigger than compress_above bytes are compressed with zstd when it's installed
+
+    Other types can be stored as msgpack extensions, they need a to_msgpack method
+    and a from_msgpack classmethod
+
+    codec = CompactCodec(ext_types={1: Dataset})
+    codec.loads(codec.dumps({'anime': Dataset(...)}))
+    """
+
+    def __init__(self, *, ext_types: tp.Optional[tp.Mapping[int, type]] = None,
+                 compress_above: int = 1024, level: int = 3):
+        self.ext_types = ext_types or {}
+        self.ext_codes = {cls: code for code, cls in self.ext_types.items()}
+        self.compress_above = compress_above
+
+        if zstandard is not None:
+            self._compressor = zstandard.ZstdCompressor(level=level)
+            self._decompressor = zstandard.ZstdDecompressor()
+
+    def dumps(self, value: tp.Any) -> bytes:
+        payload = msgpack.packb(value, use_bin_type=True, default=self._default)
+
+        flags = 0
+
+        if zstandard is not None and len(payload) > self.compress_above:
+            payload = self._compressor.compress(payload)
+            flags |= FLAG_ZSTD
+
+        return HEADER.pack(FORMAT_VERSION, flags) + payload
+
+    def loads(self, raw: bytes) -> tp.Any:
+        try:
+            version, flags = HEADER.unpack_from(raw)
+        except struct.error:
+            raise UnknownFormat("Missing header") from None
+
+        if version != FORMAT_VERSION:
+            raise UnknownFormat(f"Expected format version {FORMAT_VERSION}, got {version}")
+
+        payload = memoryview(raw)[HEADER.size:]
+
+        if flags & FLAG_ZSTD:
+            if zstandard is None:
+                raise UnknownFormat("The data is compressed but zstandard isn't installed")
+
+            try:
+                payload = self._decompressor.decompress(payload)
+            except zstandard.ZstdError as error:
+                raise UnknownFormat(str(error)) from error
+
+        return msgpack.unpackb(payload, raw=False, ext_hook=self._ext_hook)
+
+    def _default(self, obj: tp.Any) -> msgpack.ExtType:
+        if (code := self.ext_codes.get(obj.__class__)) is None:
+            raise TypeError(f"Can't encode {obj.__class__.__name__}")
+
+        return msgpack.ExtType(code, msgpack.packb(obj.to_msgpack(), use_bin_type=True, default=self._default))
+
+    def _ext_hook(self, code: int, data: bytes) -> tp.Any:
+        if (cls := self.ext_types.get(code)) is None:
+            raise UnknownFormat(f"Unknown extension type {code}")
+
+        return cls.from_msgpack(msgpack.unpackb(data, raw=False, ext_hook=self._ext_hook))
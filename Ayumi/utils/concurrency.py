@@ -0,0 +1,171 @@
+"""
+Ayumi - Discord bot
+Copyright (C) 2020 - Saphielle Akiyama | saphielle.akiyama@gmail.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import collections
+import contextlib
+import enum
+import time
+import typing as tp
+
+
+class TooBusy(Exception):
+    """Raised when too many requests are already running or waiting"""
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling a service that keeps failing"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"The service is failing, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimiter:
+    """
+    Limits how many requests run at once, overall and per key (a user),
+    a key can only have one request waiting and at most max_waiting can wait overall,
+    the others are rejected right away
+
+    limiter = ConcurrencyLimiter(limit=4, per_key=1, max_waiting=10)
+
+    async with limiter.slot(user.id):
+        await cleverbot.ask(...)
+    """
+
+    def __init__(self, *, limit: int = 4, per_key: int = 1, max_waiting: int = 10):
+        self.limit = limit
+        self.per_key = per_key
+        self.max_waiting = max_waiting
+
+        self._global = asyncio.Semaphore(limit)
+        self._keys: tp.Dict[tp.Hashable, asyncio.Semaphore] = {}
+        self._users: tp.Counter[tp.Hashable] = collections.Counter()  # running or waiting, per key
+
+        self.in_flight = 0
+        self.waiting = 0
+        self.stats = collections.Counter(accepted=0, rejected=0)
+
+    @contextlib.asynccontextmanager
+    async def slot(self, key: tp.Hashable) -> tp.AsyncGenerator[None, None]:
+        """Waits for a free slot, or raises TooBusy if there's no room to wait"""
+        if self._users[key] > self.per_key or self.waiting >= self.max_waiting:
+            self.stats['rejected'] += 1
+            raise TooBusy("Already handling too many requests")
+
+        self._users[key] += 1
+
+        if (semaphore := self._keys.get(key)) is None:
+            semaphore = self._keys[key] = asyncio.Semaphore(self.per_key)
+
+        try:
+            self.waiting += 1
+
+            try:
+                await semaphore.acquire()
+
+                try:
+                    await self._global.acquire()
+                except BaseException:
+                    semaphore.release()
+                    raise
+
+            finally:
+                self.waiting -= 1
+
+            self.in_flight += 1
+            self.stats['accepted'] += 1
+
+            try:
+                yield
+            finally:
+                self.in_flight -= 1
+                self._global.release()
+                semaphore.release()
+
+        finally:
+            self._users[key] -= 1
+
+            if not self._users[key]:  # keeps both dicts as small as the amount of active users
+                del self._users[key]
+                del self._keys[key]
+
+
+class BreakerState(enum.Enum):
+    CLOSED = 'closed'  # everything is fine
+    OPEN = 'open'  # failing, calls are rejected
+    HALF_OPEN = 'half_open'  # trying a single call to see if it's back
+
+
+class CircuitBreaker:
+    """
+    Stops calling a service after failure_threshold consecutive failures,
+    a single trial call is let through after reset_after seconds, closing the circuit if it works
+
+    breaker = CircuitBreaker()
+
+    async with breaker:
+        await cleverbot.ask(...)
+    """
+
+    def __init__(self, *, failure_threshold: int = 5, reset_after: float = 30,
+                 exceptions: tp.Tuple[tp.Type[BaseException], ...] = (Exception,)):
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.exceptions = exceptions
+
+        self.state = BreakerState.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+
+        self.stats = collections.Counter(successes=0, failures=0, short_circuited=0, opened=0)
+
+    async def __aenter__(self) -> 'CircuitBreaker':
+        if self.state is BreakerState.OPEN:
+            if (retry_after := self.opened_at + self.reset_after - time.monotonic()) > 0:
+                self.stats['short_circuited'] += 1
+                raise CircuitOpen(retry_after)
+
+            self.state = BreakerState.HALF_OPEN
+
+        elif self.state is BreakerState.HALF_OPEN:  # the trial call is still running
+            self.stats['short_circuited'] += 1
+            raise CircuitOpen(self.reset_after)
+
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.stats['successes'] += 1
+            self.failures = 0
+            self.state = BreakerState.CLOSED
+            return
+
+        if not issubclass(exc_type, self.exceptions):  # cancelled, or not the service's fault
+            if self.state is BreakerState.HALF_OPEN:
+                self.state = BreakerState.OPEN  # lets another trial through right away
+
+            return
+
+        self.stats['failures'] += 1
+        self.failures += 1
+
+        if self.state is BreakerState.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = BreakerState.OPEN
+            self.opened_at = time.monotonic()
+            self.stats['opened'] += 1
@@ -0,0 +1,176 @@
+"""
+Ayumi - Discord bot
+Copyright (C) 2020 - Saphielle Akiyama | saphielle.akiyama@gmail.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import os
+import pathlib
+import traceback
+import typing as tp
+
+import orjson
+
+Signature = tp.Tuple[int, int]  # mtime_ns, size
+
+
+class ConfigStore:
+    """
+    Reads and writes a json config file,
+    writes are debounced, atomic and made in a thread so the loop never waits for the disk,
+    and changes made to the file by someone else are picked up while running
+
+    store = ConfigStore('config.json')
+    config = store.load()
+
+    store.save(config)  # returns right away
+    store.watch(on_reload)
+    """
+
+    def __init__(self, path: tp.Union[str, os.PathLike], *, debounce: float = 1, poll_interval: float = 5):
+        self.path = pathlib.Path(path)
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+
+        self._signature: tp.Optional[Signature] = None  # of the version we last read / wrote
+        self._pending: tp.Optional[dict] = None
+        self._timer: tp.Optional[asyncio.TimerHandle] = None
+        self._writing: tp.Optional[asyncio.Future] = None
+        self._watcher: tp.Optional[asyncio.Task] = None
+
+    def _stat(self) -> tp.Optional[Signature]:
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+
+        return stat.st_mtime_ns, stat.st_size
+
+    # -- Blocking -- #
+
+    def load(self) -> dict:
+        """Reads the config, blocking, only meant to be used on startup"""
+        signature = self._stat()
+        config = orjson.loads(self.path.read_bytes())
+        self._signature = signature
+        return config
+
+    def write(self, config: dict) -> Signature:
+        """Writes the config to a temporary file then moves it over the old one, blocking"""
+        data = orjson.dumps(config, option=orjson.OPT_INDENT_2)
+
+        tmp = self.path.with_name(self.path.name + '.tmp')
+
+        with open(tmp, 'wb') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+
+        os.replace(tmp, self.path)
+
+        # makes the rename itself durable
+        if hasattr(os, 'O_DIRECTORY'):
+            fd = os.open(self.path.parent, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+        return self._stat()
+
+    # -- Saving -- #
+
+    def save(self, config: dict) -> None:
+        """Schedules a write, a burst of saves only writes the last config once"""
+        self._pending = config
+
+        if self._timer is not None:
+            self._timer.cancel()
+
+        self._timer = asyncio.get_event_loop().call_later(self.debounce, self._start_write)
+
+    def _start_write(self) -> None:
+        self._timer = None
+
+        if self._writing is not None and not self._writing.done():  # it'll be written once this one is done
+            self._writing.add_done_callback(lambda _: self._start_write())
+            return
+
+        if (config := self._pending) is None:
+            return
+
+        self._pending = None
+
+        self._writing = asyncio.ensure_future(self._write(config))
+
+    async def _write(self, config: dict) -> None:
+        loop = asyncio.get_event_loop()
+
+        try:
+            self._signature = await loop.run_in_executor(None, self.write, config)
+
+        except OSError as error:  # the config is still in memory, the next save will retry
+            traceback.print_exception(type(error), error, error.__traceback__)
+
+    async def flush(self) -> None:
+        """Writes what's pending right away, used before closing"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        if self._writing is not None:
+            await asyncio.shield(self._writing)
+
+        if (config := self._pending) is not None:
+            self._pending = None
+            await self._write(config)
+
+    # -- Hot reload -- #
+
+    def watch(self, on_reload: tp.Callable[[dict], None]) -> None:
+        """Calls on_reload with the new config whenever the file is edited by someone else"""
+        if self._watcher is None or self._watcher.done():
+            self._watcher = asyncio.ensure_future(self._watch(on_reload))
+
+    def stop_watching(self) -> None:
+        if self._watcher is not None:
+            self._watcher.cancel()
+
+    async def _watch(self, on_reload: tp.Callable[[dict], None]) -> None:
+        loop = asyncio.get_event_loop()
+
+        while True:
+            await asyncio.sleep(self.poll_interval)
+
+            if self._pending is not None or (self._writing is not None and not self._writing.done()):
+                continue  # ours is about to be written anyway
+
+            if (signature := await loop.run_in_executor(None, self._stat)) in (None, self._signature):
+                continue
+
+            try:
+                config = await loop.run_in_executor(None, self.load)
+
+            except (OSError, ValueError) as error:  # probably saved halfway through an edit, retried once it changes
+                traceback.print_exception(type(error), error, error.__traceback__)
+                self._signature = signature
+                continue
+
+            if not isinstance(config, dict):
+                self._signature = signature
+                continue
+
+            on_reload(config)
@@ -0,0 +1,129 @@
+"""
+Ayumi - Discord bot
+Copyright (C) 2020 - Saphielle Akiyama | saphielle.akiyama@gmail.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import traceback
+import typing as tp
+
+import aioredis
+import orjson
+
+from .cache import MISSING, LRUCache
+from .metrics import stage
+
+
+class Conversation(tp.NamedTuple):
+    emotion: int  # index of the emotion, lighter than its name
+    history: tp.Tuple[str, ...] = ()  # last messages, oldest first
+
+    def add(self, *messages: str, max_history: int) -> 'Conversation':
+        return self._replace(history=(self.history + messages)[-max_history:])
+
+
+class ConversationStore:
+    """
+    Keeps each user's conversation (emotion and last messages) together under a single key,
+    in a bounded memory cache and optionally in redis so it survives restarts,
+    conversations expire after ttl seconds without talking,
+    writes are batched and sent in a single pipeline every flush_interval
+
+    store = ConversationStore(redis)
+    conversation = await store.get(user.id)
+    store.set(user.id, conversation.add(question, answer, max_history=6))
+    """
+
+    def __init__(self, redis: tp.Optional[aioredis.Redis] = None, *, ttl: int = 600, max_history: int = 6,
+                 max_entries: int = 4096, flush_interval: float = 1):
+        self.redis = redis
+        self.ttl = ttl
+        self.max_history = max_history
+        self.flush_interval = flush_interval
+
+        self.memory = LRUCache(max_entries=max_entries)
+
+        self._dirty: tp.Dict[int, Conversation] = {}
+        self._flusher: tp.Optional[asyncio.Task] = None
+
+    @staticmethod
+    def key(user_id: int) -> str:
+        return f'cleverbot:{user_id}'
+
+    async def get(self, user_id: int) -> tp.Optional[Conversation]:
+        """Gets a conversation from memory, then from redis with a single GET"""
+        if (conversation := self.memory.get(user_id)) is not MISSING:
+            return conversation
+
+        if self.redis is None:
+            return None
+
+        with stage('redis'):
+            raw = await self.redis.get(self.key(user_id))
+
+        if raw is None:
+            return None
+
+        try:
+            emotion, history = orjson.loads(raw)
+        except ValueError:  # written by an older version
+            return None
+
+        conversation = Conversation(emotion, tuple(history))
+
+        self.memory.set(user_id, conversation, ttl=self.ttl)
+
+        return conversation
+
+    def set(self, user_id: int, conversation: Conversation) -> None:
+        """Stores a conversation, sent to redis with the next batch"""
+        self.memory.set(user_id, conversation, ttl=self.ttl)
+
+        if self.redis is None:
+            return
+
+        self._dirty[user_id] = conversation
+
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.ensure_future(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Writes every changed conversation in a single round trip"""
+        if not self._dirty:
+            return
+
+        dirty, self._dirty = self._dirty, {}
+
+        pipe = self.redis.pipeline()
+
+        for user_id, conversation in dirty.items():
+            pipe.set(self.key(user_id), orjson.dumps([conversation.emotion, conversation.history]), expire=self.ttl)
+
+        try:
+            await pipe.execute()
+
+        except Exception as error:  # conversations are still in memory, they're not worth retrying
+            traceback.print_exception(type(error), error, error.__traceback__)
+
+    async def close(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+
+        await self.flush()
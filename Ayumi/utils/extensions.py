@@ -0,0 +1,153 @@
+"""
+Ayumi - Discord bot
+Copyright (C) 2020 - Saphielle Akiyama | saphielle.akiyama@gmail.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+import ast
+import asyncio
+import importlib
+import importlib.util
+import sys
+import time
+import typing as tp
+
+from discord.ext import commands
+
+
+class ExtensionTiming(tp.NamedTuple):
+    name: str
+    imports: float  # seconds spent importing its dependencies, off the event loop
+    load: float  # seconds spent running the module and its setup, on the event loop
+    error: tp.Optional[Exception] = None
+
+
+def module_dependencies(name: str) -> tp.List[str]:
+    """The absolute imports at the top level of a module that aren't imported yet, read without running it"""
+    try:
+        spec = importlib.util.find_spec(name)
+        source = spec.loader.get_source(name)
+        tree = ast.parse(source)
+
+    except (ImportError, AttributeError, SyntaxError, ValueError):  # load_extension will report it
+        return []
+
+    names = []
+
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names.extend(alias.name for alias in node.names)
+
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            names.append(node.module)
+
+    return [n for n in dict.fromkeys(names) if n not in sys.modules]
+
+
+def import_modules(names: tp.Iterable[str]) -> None:
+    """Imports some modules, blocking, failures are left for load_extension to report"""
+    for name in names:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            pass
+
+
+class ExtensionLoader:
+    """
+    Loads extensions with their heavy imports done in the executor beforehand,
+    and keeps how long each one took
+
+    Lazy extensions are only loaded once one of their commands is used,
+    their listeners and background tasks don't run and they're missing from help until then,
+    so it only suits cogs that don't do any work on their own (myanimelist warms its cache, it shouldn't be)
+
+    loader = ExtensionLoader(bot)
+    loader.add_lazy('cogs.myanimelist', ['mal'])
+    await loader.load_many(['jishaku', 'cogs.meta'])
+    """
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+
+        self.timings: tp.Dict[str, ExtensionTiming] = {}
+        self.lazy_commands: tp.Dict[str, str] = {}  # command name -> extension
+
+        self._loading: tp.Dict[str, asyncio.Future] = {}
+
+    @property
+    def lazy_extensions(self) -> tp.Set[str]:
+        return set(self.lazy_commands.values())
+
+    def add_lazy(self, extension: str, command_names: tp.Iterable[str]) -> None:
+        for name in command_names:
+            self.lazy_commands[name] = extension
+
+    async def prefetch(self, extension: str) -> float:
+        """Imports the dependencies of an extension in the executor, returns how long it took"""
+        start = time.perf_counter()
+
+        loop = asyncio.get_event_loop()
+
+        if names := await loop.run_in_executor(None, module_dependencies, extension):
+            await loop.run_in_executor(None, import_modules, names)
+
+        return time.perf_counter() - start
+
+    def load(self, extension: str, *, imports: float = 0) -> ExtensionTiming:
+        """Loads an extension on the event loop and records the timing, errors are returned rather than raised"""
+        start = time.perf_counter()
+
+        try:
+            self.bot.load_extension(extension)
+        except Exception as error:
+            timing = ExtensionTiming(extension, imports, time.perf_counter() - start, error)
+        else:
+            timing = ExtensionTiming(extension, imports, time.perf_counter() - start)
+
+        self.timings[extension] = timing
+
+        return timing
+
+    async def load_many(self, extensions: tp.Iterable[str]) -> tp.List[ExtensionTiming]:
+        """Prefetches every extension concurrently, then loads them in order as soon as they're ready"""
+        prefetches = {ext: asyncio.ensure_future(self.prefetch(ext)) for ext in extensions}
+
+        return [self.load(ext, imports=await prefetch) for ext, prefetch in prefetches.items()]
+
+    async def load_lazy(self, extension: str) -> tp.Optional[ExtensionTiming]:
+        """Loads a lazy extension, concurrent calls share the same load, None if it was already loaded"""
+        if extension in self.bot.extensions:
+            return None
+
+        if (future := self._loading.get(extension)) is None:
+            future = self._loading[extension] = asyncio.ensure_future(self.load_many([extension]))
+            future.add_done_callback(lambda _: self._loading.pop(extension, None))
+
+        timing, = await asyncio.shield(future)
+
+        return timing
+
+    def report(self) -> str:
+        """A table of how long each extension took, slowest first"""
+        timings = sorted(self.timings.values(), key=lambda t: t.imports + t.load, reverse=True)
+
+        lines = [f"{t.name:<20} {t.imports * 1000:>6.0f}ms {t.load * 1000:>6.0f}ms{' (failed)' if t.error else ''}"
+                 for t in timings]
+
+        lines.extend(f"{ext:<20} lazy" for ext in sorted(self.lazy_extensions - self.timings.keys()))
+
+        return '\n'.join([f"{'extension':<20} {'imports':>8} {'load':>8}", *lines])
@@ -0,0 +1,180 @@
+"""
+Ayumi - Discord bot
+Copyright (C) 2020 - Saphielle Akiyama | saphielle.akiyama@gmail.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import collections
+import gzip
+import os
+import pathlib
+import typing as tp
+
+import orjson
+
+from .cache import normalize_key_part
+from .jikan import MODELS, Entry
+
+INDEX_VERSION = 3
+
+TITLE_FIELDS = 'title', 'title_english', 'title_japanese'
+
+DocKey = tp.Tuple[str, int]  # media, mal_id
+
+
+def trigrams(text: str) -> tp.Set[str]:
+    """Returns the trigrams of a normalized text, padded so short words still have some"""
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def entry_titles(entry: Entry) -> tp.List[str]:
+    """Returns every normalized title an entry is known by"""
+    titles = [getattr(entry, field) for field in TITLE_FIELDS]
+
+    titles.extend(entry.title_synonyms or ())
+
+    return [*{normalize_key_part(t) for t in titles if t}]
+
+
+class TitleIndex:
+    """
+    An in-memory trigram index over the titles of the entries we got from jikan,
+    able to answer fuzzy title lookups without any request,
+    it can be saved to / loaded from a compressed file
+
+    index = TitleIndex()
+    index.add('anime', season_data['anime'])
+    index.search('anime', 'shingeki no kyojin')
+    """
+
+    def __init__(self):
+        self._entries: tp.Dict[DocKey, Entry] = {}
+        self._titles: tp.Dict[DocKey, tp.List[tp.Tuple[str, tp.FrozenSet[str]]]] = {}
+        self._postings: tp.DefaultDict[str, tp.Set[tp.Tuple[DocKey, int]]] = collections.defaultdict(set)
+
+        self.dirty = False  # whether there are changes that weren't saved
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, media: str, entries: tp.Iterable[Entry]) -> None:
+        """Indexes entries, replacing the previous version of those we already knew"""
+        for entry in entries:
+            if (mal_id := entry.mal_id) is None:
+                continue
+
+            key = (media, mal_id)
+
+            self._remove(key)
+
+            self._entries[key] = entry
+
+            self._titles[key] = titles = [(title, frozenset(trigrams(title))) for title in entry_titles(entry)]
+
+            for title_index, (_, grams) in enumerate(titles):
+                for gram in grams:
+                    self._postings[gram].add((key, title_index))
+
+            self.dirty = True
+
+    def _remove(self, key: DocKey) -> None:
+        if self._entries.pop(key, None) is None:
+            return
+
+        for title_index, (_, grams) in enumerate(self._titles.pop(key)):
+            for gram in grams:
+                postings = self._postings[gram]
+                postings.discard((key, title_index))
+
+                if not postings:
+                    del self._postings[gram]
+
+    def search(self, media: str, query: str, *, limit: int = 50, threshold: float = 0.8,
+               min_similarity: float = 0) -> tp.List[Entry]:
+        """
+        Returns the entries whose titles contain most of the query's trigrams, best matches first,
+        threshold is the minimum fraction of the query's trigrams a title must contain,
+        min_similarity only keeps titles close to the query as a whole (1 is the same title)
+        """
+        query_grams = trigrams(normalize_key_part(query))
+
+        overlaps: tp.Counter[tp.Tuple[DocKey, int]] = collections.Counter()
+
+        for gram in query_grams:
+            overlaps.update(self._postings.get(gram, ()))
+
+        scores: tp.Dict[DocKey, tp.Tuple[float, float]] = {}
+
+        for (key, title_index), overlap in overlaps.items():
+            if key[0] != media or (containment := overlap / len(query_grams)) < threshold:
+                continue
+
+            _, title_grams = self._titles[key][title_index]
+
+            similarity = 2 * overlap / (len(query_grams) + len(title_grams))  # prefers closer lengths
+
+            if similarity < min_similarity:
+                continue
+
+            scores[key] = max(scores.get(key, (0, 0)), (containment, similarity))
+
+        best = sorted(scores, key=scores.__getitem__, reverse=True)[:limit]
+
+        return [self._entries[key] for key in best]
+
+    def merge(self, other: 'TitleIndex') -> None:
+        """Adds every entry of another index, replacing ours"""
+        for (media, _), entry in other._entries.items():
+            self.add(media, (entry,))
+
+    # -- Persistence -- #
+
+    def snapshot(self) -> tp.List[tp.Tuple[str, list]]:
+        """Returns what needs to be saved, cheap enough to be done on the event loop"""
+        return [(media, entry.to_list()) for (media, _), entry in self._entries.items()]
+
+    @staticmethod
+    def save(path: tp.Union[str, os.PathLike], snapshot: tp.List[tp.Tuple[str, list]]) -> None:
+        """Compresses and writes a snapshot to a file, blocking"""
+        data = gzip.compress(orjson.dumps({'version': INDEX_VERSION, 'entries': snapshot}), compresslevel=6)
+
+        path = pathlib.Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        tmp = path.with_suffix(path.suffix + '.tmp')
+        tmp.write_bytes(data)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: tp.Union[str, os.PathLike]) -> 'TitleIndex':
+        """Reads an index from a file, blocking, returns an empty one if it's missing or outdated"""
+        index = cls()
+
+        try:
+            data = orjson.loads(gzip.decompress(pathlib.Path(path).read_bytes()))
+
+        except (OSError, ValueError):
+            return index
+
+        if data.get('version') != INDEX_VERSION:
+            return index
+
+        for media, values in data['entries']:
+            index.add(media, (MODELS[media].from_list(values),))
+
+        index.dirty = False
+
+        return index
@@ -0,0 +1,242 @@
+"""
+Ayumi - Discord bot
+Copyright (C) 2020 - Saphielle Akiyama | saphielle.akiyama@gmail.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import typing as tp
+
+NSFW_RATINGS = {'R+', 'RX'}
+
+ENTRY_SIZE = 3 * 1024  # about what a parsed entry takes in memory, see benchmarks.jikan_models
+
+
+class Genre(tp.NamedTuple):
+    mal_id: int
+    name: str
+    url: str
+
+
+class Producer(tp.NamedTuple):
+    mal_id: int
+    name: str
+    url: str
+
+
+def parse_named(cls: tp.Type[tp.NamedTuple], data: tp.Optional[tp.List[dict]]) -> tp.Optional[tuple]:
+    """Parses jikan's lists of {'mal_id', 'type', 'name', 'url'}"""
+    if data is None:
+        return None
+
+    make = cls._make  # skips the generated __new__, noticeably faster
+
+    return tuple([make((d.get('mal_id'), d.get('name'), d.get('url'))) for d in data])
+
+
+class Entry:
+    """
+    An immutable record holding the fields we use of an anime / manga,
+    missing fields are None and lists are tuples
+
+    Subclasses list their fields in FIELDS (which are also their slots)
+    and how to parse the nested ones in NESTED
+    """
+
+    __slots__ = FIELDS = (
+        'mal_id', 'url', 'title', 'title_english', 'title_japanese', 'title_synonyms',
+        'synopsis', 'image_url', 'genres', 'rank', 'score', 'start_date', 'end_date', 'r18',
+    )
+
+    NESTED: tp.Dict[str, tp.Type[tp.NamedTuple]] = {'genres': Genre}
+    TUPLES: tp.Tuple[str, ...] = ('title_synonyms',)
+
+    mal_id: int
+    url: str
+    title: str
+    title_english: tp.Optional[str]
+    title_japanese: tp.Optional[str]
+    title_synonyms: tp.Optional[tp.Tuple[str, ...]]
+    synopsis: tp.Optional[str]
+    image_url: tp.Optional[str]
+    genres: tp.Optional[tp.Tuple[Genre, ...]]
+    rank: tp.Optional[int]
+    score: tp.Optional[float]
+    start_date: tp.Optional[str]
+    end_date: tp.Optional[str]
+    r18: tp.Optional[bool]
+
+    def __init__(self, **fields):
+        for name in self.FIELDS:
+            object.__setattr__(self, name, fields.get(name))
+
+    def __setattr__(self, name: str, value: tp.Any):
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} mal_id={self.mal_id} title={self.title!r}>"
+
+    def __eq__(self, other: tp.Any) -> bool:
+        return self.__class__ is other.__class__ and self.to_list() == other.to_list()
+
+    def __hash__(self) -> int:
+        return hash((self.__class__, self.mal_id))
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Entry':
+        """Parses an entry out of jikan's json, only keeping the fields we use"""
+        self = cls.__new__(cls)
+        set_ = object.__setattr__
+
+        for name in cls.FIELDS:
+            set_(self, name, data.get(name))
+
+        for name, named in cls.NESTED.items():
+            set_(self, name, parse_named(named, data.get(name)))
+
+        for name in cls.TUPLES:
+            if (values := data.get(name)) is not None:
+                set_(self, name, tuple(values))
+
+        return self
+
+    def to_list(self) -> list:
+        """A compact json / msgpack friendly representation, the values in the order of FIELDS"""
+        values = [getattr(self, name) for name in self.FIELDS]
+
+        for i, name in enumerate(self.FIELDS):
+            if name in self.NESTED and values[i] is not None:
+                values[i] = [list(n) for n in values[i]]
+
+        return values
+
+    @classmethod
+    def from_list(cls, values: tp.Sequence) -> 'Entry':
+        """Reverses to_list"""
+        self = cls.__new__(cls)
+        set_ = object.__setattr__
+
+        for name, value in zip(cls.FIELDS, values):
+            if value is not None:
+                if name in cls.NESTED:
+                    value = tuple(map(cls.NESTED[name]._make, value))
+
+                elif name in cls.TUPLES:
+                    value = tuple(value)
+
+            set_(self, name, value)
+
+        return self
+
+    @property
+    def is_safe(self) -> bool:
+        """Whether the entry can be displayed in a sfw channel"""
+        return not self.r18
+
+
+class Anime(Entry):
+    __slots__ = ('rated', 'episodes', 'airing', 'producers', 'licensors')
+
+    FIELDS = Entry.FIELDS + __slots__
+    NESTED = {**Entry.NESTED, 'producers': Producer}
+    TUPLES = Entry.TUPLES + ('licensors',)
+
+    rated: tp.Optional[str]
+    episodes: tp.Optional[int]
+    airing: tp.Optional[bool]
+    producers: tp.Optional[tp.Tuple[Producer, ...]]
+    licensors: tp.Optional[tp.Tuple[str, ...]]
+
+    @property
+    def is_safe(self) -> bool:
+        return not self.r18 and (self.rated or '').upper() not in NSFW_RATINGS
+
+
+class Manga(Entry):
+    __slots__ = ('volumes', 'chapters', 'publishing')
+
+    FIELDS = Entry.FIELDS + __slots__
+
+    volumes: tp.Optional[int]
+    chapters: tp.Optional[int]
+    publishing: tp.Optional[bool]
+
+
+MODELS: tp.Dict[str, tp.Type[Entry]] = {'anime': Anime, 'manga': Manga}
+
+
+class Dataset:
+    """
+    An immutable list of entries along with the indices of the sfw ones,
+    a single instance is shared by every menu displaying it
+    """
+
+    __slots__ = ('model', 'entries', 'safe')
+
+    def __init__(self, model: tp.Type[Entry], entries: tp.Iterable[Entry],
+                 safe: tp.Optional[tp.Sequence[int]] = None):
+        object.__setattr__(self, 'model', model)
+        object.__setattr__(self, 'entries', tuple(entries))
+
+        if safe is None:
+            safe = [i for i, entry in enumerate(self.entries) if entry.is_safe]
+
+        object.__setattr__(self, 'safe', tuple(safe))
+
+    def __setattr__(self, name: str, value: tp.Any):
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self) -> tp.Iterator[Entry]:
+        return iter(self.entries)
+
+    def __getitem__(self, index: int) -> Entry:
+        return self.entries[index]
+
+    def estimated_size(self) -> int:
+        """Used by the memory cache, walking every entry would be too slow"""
+        return len(self.entries) * ENTRY_SIZE
+
+    def view(self, *, is_nsfw: bool) -> tp.Sequence[int]:
+        """Returns the indices of the entries that can be displayed, without copying anything"""
+        return range(len(self.entries)) if is_nsfw else self.safe
+
+    # msgpack extension type
+
+    def to_msgpack(self) -> list:
+        media = next(media for media, model in MODELS.items() if model is self.model)
+        return [media, [entry.to_list() for entry in self.entries], self.safe]
+
+    @classmethod
+    def from_msgpack(cls, data: list) -> 'Dataset':
+        media, entries, safe = data
+        model = MODELS[media]
+        return cls(model, map(model.from_list, entries), safe)
+
+
+EXT_TYPES = {1: Dataset}  # the types the cache's codec needs to know about
+
+
+def project_payload(media: str, data: dict) -> tp.Dict[str, Dataset]:
+    """
+    Parses the lists of entries of a jikan response (anime, top, results, monday...)
+    into datasets of the media's model, anything else is dropped
+    """
+    model = MODELS[media]
+
+    return {key: Dataset(model, map(model.from_dict, value))
+            for key, value in data.items()
+            if isinstance(value, list) and all(isinstance(entry, dict) for entry in value)}
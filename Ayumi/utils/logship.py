@@ -0,0 +1,174 @@
+"""
+Ayumi - Discord bot
+Copyright (C) 2020 - Saphielle Akiyama | saphielle.akiyama@gmail.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import collections
+import hashlib
+import itertools
+import time
+import traceback
+import typing as tp
+
+import discord
+
+MAX_EMBEDS = 10  # per webhook message, discord's limits
+MAX_CHARACTERS = 6000
+
+
+def fingerprint(text: str) -> str:
+    """Identifies a traceback (or anything else) so identical ones are only logged once"""
+    return hashlib.sha1(text.encode()).hexdigest()[:12]
+
+
+class PendingLog:
+    __slots__ = ('embed', 'count', 'queued_at')
+
+    def __init__(self, embed: discord.Embed):
+        self.embed = embed
+        self.count = 1
+        self.queued_at = time.monotonic()
+
+
+class LogShipper:
+    """
+    Sends logs to a webhook in batches instead of one message per log,
+    identical logs (same fingerprint) are merged, and dropped if they were sent recently,
+    logs beyond max_queue are dropped so an outage can't pile up forever
+
+    shipper = LogShipper(bot.log_webhook)
+    shipper.start()
+    shipper.submit(embed, fingerprint=fingerprint(tb))
+    """
+
+    def __init__(self, webhook: discord.Webhook, *, max_queue: int = 100, interval: float = 5,
+                 dedupe_window: float = 300):
+        self.webhook = webhook
+        self.max_queue = max_queue
+        self.interval = interval
+        self.dedupe_window = dedupe_window
+
+        self._pending: tp.Dict[str, PendingLog] = collections.OrderedDict()
+        self._sent: tp.Dict[str, float] = {}  # fingerprint: when it was last sent
+        self._unique = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: tp.Optional[asyncio.Task] = None
+
+        self.stats = collections.Counter(submitted=0, sent=0, merged=0, deduplicated=0, dropped=0, failed=0)
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def submit(self, embed: discord.Embed, *, fingerprint: tp.Optional[str] = None) -> None:
+        """Queues a log, never blocks"""
+        self.stats['submitted'] += 1
+
+        if fingerprint is None:
+            fingerprint = f'unique-{next(self._unique)}'
+
+        if (pending := self._pending.get(fingerprint)) is not None:
+            pending.count += 1
+            self.stats['merged'] += 1
+            return
+
+        if time.monotonic() - self._sent.get(fingerprint, -self.dedupe_window) < self.dedupe_window:
+            self.stats['deduplicated'] += 1
+            return
+
+        if len(self._pending) >= self.max_queue:
+            self.stats['dropped'] += 1
+            return
+
+        self._pending[fingerprint] = PendingLog(embed)
+
+        if len(self._pending) >= MAX_EMBEDS:  # a full batch doesn't need to wait
+            self._wakeup.set()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def close(self) -> None:
+        """Stops the shipper and sends what's left"""
+        if self._task is not None:
+            self._task.cancel()
+
+        while self._pending:
+            if not await self.flush():
+                break
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+            self._wakeup.clear()
+
+            while self._pending:
+                if not await self.flush():  # discord is having a bad time too, retried next interval
+                    break
+
+    async def flush(self) -> bool:
+        """Sends a batch of logs, returns whether it went through"""
+        batch = []
+        embeds = []
+        characters = 0
+
+        for key, pending in itertools.islice(self._pending.items(), MAX_EMBEDS):
+            embed = pending.embed
+
+            if pending.count > 1:
+                embed = embed.copy()
+                embed.set_footer(text=f"Happened {pending.count} times")
+
+            if embeds and characters + len(embed) > MAX_CHARACTERS:
+                break
+
+            characters += len(embed)
+            batch.append((key, pending))
+            embeds.append(embed)
+
+        try:
+            await self.webhook.send(embeds=embeds)
+
+        except discord.HTTPException as error:
+            self.stats['failed'] += 1
+            traceback.print_exception(type(error), error, error.__traceback__)
+
+            if error.status < 500 and error.status != 429:  # discord won't ever accept those
+                for key, _ in batch:
+                    del self._pending[key]
+
+                self.stats['dropped'] += len(batch)
+
+            return False
+
+        now = time.monotonic()
+
+        for key, _ in batch:
+            del self._pending[key]
+
+            if not key.startswith('unique-'):
+                self._sent[key] = now
+
+        self._sent = {key: sent for key, sent in self._sent.items() if now - sent < self.dedupe_window}
+
+        self.stats['sent'] += len(batch)
+
+        return True
@@ -0,0 +1,150 @@
+"""
+Ayumi - Discord bot
+Copyright (C) 2020 - Saphielle Akiyama | saphielle.akiyama@gmail.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import collections
+import time
+import typing as tp
+
+import discord
+import psutil
+from discord.ext import commands, menus
+
+
+class LiveMenu:
+    __slots__ = ('menu', 'kind', 'user_id', 'channel_id', 'message_id', 'last_active')
+
+    def __init__(self, menu: menus.Menu, kind: str, user_id: int, channel_id: int):
+        self.menu = menu
+        self.kind = kind
+        self.user_id = user_id
+        self.channel_id = channel_id
+        self.message_id = menu.message.id
+        self.last_active = time.monotonic()
+
+
+class MenuManager:
+    """
+    Keeps track of every running menu and caps how many there are,
+    per user, per channel and overall, a user's new menu replaces their previous one of the same kind,
+    idle menus are stopped first when there are too many or the process uses more than max_rss bytes
+
+    manager = MenuManager()
+    await manager.start(menu, ctx, kind='mal', wait=True)
+    """
+
+    def __init__(self, *, max_per_user: int = 3, max_per_channel: int = 10, max_total: int = 500,
+                 max_rss: int = 512 * 1024 * 1024, idle_after: float = 60):
+        self.max_per_user = max_per_user
+        self.max_per_channel = max_per_channel
+        self.max_total = max_total
+        self.max_rss = max_rss
+        self.idle_after = idle_after
+
+        self._menus: tp.Dict[int, LiveMenu] = collections.OrderedDict()  # message id: menu, least active first
+        self._process = psutil.Process()
+
+        self.stats = collections.Counter(started=0, replaced=0, evicted=0)
+
+    def __len__(self) -> int:
+        return len(self._menus)
+
+    @property
+    def rss(self) -> int:
+        """The memory the whole process uses, menus (and the pages they render) are the part we can let go of"""
+        return self._process.memory_info().rss
+
+    def counts(self) -> tp.Counter[str]:
+        """How many menus of each kind are running"""
+        return collections.Counter(live.kind for live in self._menus.values())
+
+    def touch(self, message_id: int) -> None:
+        """Marks a menu as active, called on reactions"""
+        if (live := self._menus.get(message_id)) is not None:
+            live.last_active = time.monotonic()
+            self._menus.move_to_end(message_id)
+
+    # -- Starting / stopping -- #
+
+    async def start(self, menu: menus.Menu, ctx: commands.Context, *, kind: str,
+                    channel: tp.Optional[discord.abc.Messageable] = None,
+                    wait: bool = False) -> tp.Optional[asyncio.Future]:
+        """Starts a menu, making room for it first, returns what's done once it's over (None if it's already)"""
+        channel = channel or ctx.channel
+        user_id = ctx.author.id
+
+        self._make_room(kind, user_id, channel.id)
+
+        await menu.start(ctx, channel=channel)
+
+        if not menu.should_add_reactions() or menu.message is None:  # a single page, nothing to manage
+            return None
+
+        live = LiveMenu(menu, kind, user_id, channel.id)
+
+        self._menus[live.message_id] = live
+        self.stats['started'] += 1
+
+        done = asyncio.ensure_future(menu._event.wait())  # set once the menu is over
+        done.add_done_callback(lambda _: self._menus.pop(live.message_id, None))
+
+        self._evict_under_pressure()
+
+        if wait:
+            await asyncio.shield(done)
+
+        return done
+
+    def _stop(self, live: LiveMenu, reason: str) -> None:
+        self._menus.pop(live.message_id, None)
+        self.stats[reason] += 1
+        live.menu.stop()
+
+    def _make_room(self, kind: str, user_id: int, channel_id: int) -> None:
+        user_menus = [live for live in self._menus.values() if live.user_id == user_id]
+
+        for live in user_menus:
+            if live.kind == kind:
+                self._stop(live, 'replaced')
+                user_menus.remove(live)
+                break
+
+        # least active first, one spot is needed for the new menu
+        for live in user_menus[:max(len(user_menus) - self.max_per_user + 1, 0)]:
+            self._stop(live, 'evicted')
+
+        channel_menus = [live for live in self._menus.values() if live.channel_id == channel_id]
+
+        for live in channel_menus[:max(len(channel_menus) - self.max_per_channel + 1, 0)]:
+            self._stop(live, 'evicted')
+
+        while len(self._menus) >= self.max_total:
+            self._stop(next(iter(self._menus.values())), 'evicted')
+
+    def _evict_under_pressure(self) -> None:
+        """
+        Stops every idle menu when the process uses too much memory,
+        the rss doesn't go down right away so there's no point in stopping them one by one
+        """
+        if self.rss <= self.max_rss:
+            return
+
+        idle_before = time.monotonic() - self.idle_after
+
+        for live in [live for live in self._menus.values() if live.last_active < idle_before]:
+            self._stop(live, 'evicted')
@@ -0,0 +1,253 @@
+"""
+Ayumi - Discord bot
+Copyright (C) 2020 - Saphielle Akiyama | saphielle.akiyama@gmail.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import bisect
+import contextlib
+import contextvars
+import time
+import typing as tp
+
+from aiohttp import web
+
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+
+current_command = contextvars.ContextVar('current_command', default=None)  # set before invoking a command
+
+Labels = tp.Tuple[str, ...]
+
+
+def escape(value: tp.Any) -> str:
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def format_labels(names: tp.Sequence[str], values: tp.Sequence[tp.Any]) -> str:
+    if not names:
+        return ''
+
+    return '{' + ','.join(f'{n}="{escape(v)}"' for n, v in zip(names, values)) + '}'
+
+
+def format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """A named family of samples, one per combination of labels"""
+
+    type = 'untyped'
+
+    def __init__(self, name: str, help: str, labels: tp.Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+
+        self._values: tp.Dict[Labels, tp.Any] = {}
+
+    def _key(self, labels: tp.Dict[str, tp.Any]) -> Labels:
+        return tuple(str(labels.get(name, '')) for name in self.labels)
+
+    def samples(self) -> tp.Iterator[tp.Tuple[str, Labels, tp.Sequence[str], float]]:
+        """Yields the name, label values, label names and value of every sample"""
+        for key, value in self._values.items():
+            yield self.name, key, self.labels, value
+
+    def render(self) -> tp.List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type}']
+
+        for name, values, names, value in self.samples():
+            lines.append(f'{name}{format_labels(names, values)} {format_value(value)}')
+
+        return lines
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    """Counts observations into cumulative buckets, like prometheus' histograms"""
+
+    type = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: tp.Sequence[str] = (), *,
+                 buckets: tp.Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+
+        if (state := self._values.get(key)) is None:
+            self._values[key] = state = [[0] * (len(self.buckets) + 1), 0.0, 0]  # counts, sum, count
+
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels) -> tp.Generator[None, None, None]:
+        """Observes how long the block took"""
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        names = self.labels + ('le',)
+
+        for key, (counts, total, count) in self._values.items():
+            cumulative = 0
+
+            for bound, bucket in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket
+                yield f'{self.name}_bucket', key + (format_value(bound),), names, cumulative
+
+            yield f'{self.name}_sum', key, self.labels, total
+            yield f'{self.name}_count', key, self.labels, count
+
+
+class Collected(Metric):
+    """Reads its values from a function when rendered, for things that already count by themselves"""
+
+    def __init__(self, name: str, help: str, func: tp.Callable[[], tp.Mapping[tp.Any, float]],
+                 labels: tp.Sequence[str] = (), *, type: str = 'gauge'):
+        super().__init__(name, help, labels)
+        self.func = func
+        self.type = type
+
+    def samples(self):
+        for key, value in self.func().items():
+            key = key if isinstance(key, tuple) else (key,)
+            yield self.name, tuple(map(str, key)), self.labels, value
+
+
+class Metrics:
+    """
+    A registry of metrics, rendered in prometheus' text format
+
+    metrics = Metrics()
+    hits = metrics.counter('cache_hits_total', 'Cache hits', labels=('tier',))
+    hits.inc(tier='memory')
+    """
+
+    def __init__(self):
+        self._metrics: tp.Dict[str, Metric] = {}
+
+    def _get_or_add(self, cls: tp.Type[Metric], name: str, *args, **kwargs) -> tp.Any:
+        if (metric := self._metrics.get(name)) is None:
+            metric = self._metrics[name] = cls(name, *args, **kwargs)
+
+        elif not isinstance(metric, cls):
+            raise ValueError(f"{name} is already registered as a {metric.type}")
+
+        return metric
+
+    def counter(self, name: str, help: str, labels: tp.Sequence[str] = ()) -> Counter:
+        return self._get_or_add(Counter, name, help, labels)
+
+    def gauge(self, name: str, help: str, labels: tp.Sequence[str] = ()) -> Gauge:
+        return self._get_or_add(Gauge, name, help, labels)
+
+    def histogram(self, name: str, help: str, labels: tp.Sequence[str] = (), **kwargs) -> Histogram:
+        return self._get_or_add(Histogram, name, help, labels, **kwargs)
+
+    def collect(self, name: str, help: str, func: tp.Callable[[], tp.Mapping[tp.Any, float]],
+                labels: tp.Sequence[str] = (), *, type: str = 'gauge') -> Collected:
+        """Registers (or replaces, when a cog is reloaded) a metric read from func"""
+        metric = self._metrics[name] = Collected(name, help, func, labels, type=type)
+        return metric
+
+    def remove(self, *names: str) -> None:
+        for name in names:
+            self._metrics.pop(name, None)
+
+    def render(self) -> str:
+        lines = []
+
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Metrics()
+
+COMMAND_SECONDS = REGISTRY.histogram('ayumi_command_seconds', 'Time spent running commands', ('command', 'status'))
+
+COMMAND_ERRORS = REGISTRY.counter('ayumi_command_errors_total', 'Errors raised by commands', ('command', 'error'))
+
+STAGE_SECONDS = REGISTRY.histogram('ayumi_stage_seconds', 'Time spent in each stage of a command', ('command', 'stage'))
+
+MENU_SECONDS = REGISTRY.histogram('ayumi_menu_open_seconds', 'Time commands spent waiting for their menu to end',
+                                  ('command',), buckets=(1, 5, 15, 30, 60, 120, 180, 300))
+
+UPSTREAM_ERRORS = REGISTRY.counter('ayumi_upstream_errors_total', 'Errors returned by the apis we use', ('service', 'error'))
+
+
+def stage(name: str) -> tp.ContextManager[None]:
+    """
+    Times a block as a stage of the command being run
+
+    with utils.metrics.stage('redis'):
+        await redis.get(key)
+    """
+    return STAGE_SECONDS.time(command=current_command.get() or '', stage=name)
+
+
+class MetricsServer:
+    """Serves the registry on /metrics, on the bot's event loop"""
+
+    def __init__(self, registry: Metrics = REGISTRY, *, host: str = '127.0.0.1', port: int = 9091):
+        self.registry = registry
+        self.host = host
+        self.port = port
+
+        self._runner: tp.Optional[web.AppRunner] = None
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.registry.render(), content_type='text/plain', charset='utf-8')
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get('/metrics', self.handle_metrics)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
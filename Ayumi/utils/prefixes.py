@@ -0,0 +1,97 @@
+"""
+Ayumi - Discord bot
+Copyright (C) 2020 - Saphielle Akiyama | saphielle.akiyama@gmail.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import traceback
+import typing as tp
+
+import aioredis
+
+PREFIXES_KEY = 'prefixes'  # hash of guild id: prefix
+
+
+class PrefixStore:
+    """
+    Per guild prefixes, stored in a redis hash and mirrored in memory
+    so looking one up never waits for redis, the mirror is refreshed every refresh_interval
+    in case another process changed it, on_change is called whenever it changes
+
+    store = PrefixStore(redis, on_change=rebuild)
+    await store.load()
+
+    store.get(guild.id)
+    """
+
+    def __init__(self, redis: aioredis.Redis, *, on_change: tp.Callable[[], None] = lambda: None,
+                 refresh_interval: float = 300):
+        self.redis = redis
+        self.on_change = on_change
+        self.refresh_interval = refresh_interval
+
+        self._prefixes: tp.Dict[int, str] = {}
+        self._refresher: tp.Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._prefixes)
+
+    def items(self) -> tp.ItemsView[int, str]:
+        return self._prefixes.items()
+
+    def get(self, guild_id: int) -> tp.Optional[str]:
+        return self._prefixes.get(guild_id)
+
+    async def load(self) -> None:
+        """Reads every prefix from redis"""
+        raw = await self.redis.hgetall(PREFIXES_KEY, encoding='utf-8')
+
+        prefixes = {int(guild_id): prefix for guild_id, prefix in raw.items()}
+
+        if prefixes != self._prefixes:
+            self._prefixes = prefixes
+            self.on_change()
+
+    async def set(self, guild_id: int, prefix: str) -> None:
+        await self.redis.hset(PREFIXES_KEY, guild_id, prefix)
+
+        self._prefixes[guild_id] = prefix
+        self.on_change()
+
+    async def reset(self, guild_id: int) -> None:
+        """Goes back to the default prefix"""
+        await self.redis.hdel(PREFIXES_KEY, guild_id)
+
+        if self._prefixes.pop(guild_id, None) is not None:
+            self.on_change()
+
+    def start(self) -> None:
+        if self._refresher is None or self._refresher.done():
+            self._refresher = asyncio.ensure_future(self._refresh())
+
+    def stop(self) -> None:
+        if self._refresher is not None:
+            self._refresher.cancel()
+
+    async def _refresh(self) -> None:
+        while True:
+            try:
+                await self.load()
+
+            except Exception as error:  # the mirror is still usable
+                traceback.print_exception(type(error), error, error.__traceback__)
+
+            await asyncio.sleep(self.refresh_interval)
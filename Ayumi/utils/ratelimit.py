@@ -0,0 +1,150 @@
+"""
+Ayumi - Discord bot
+Copyright (C) 2020 - Saphielle Akiyama | saphielle.akiyama@gmail.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import collections
+import hashlib
+import os
+import time
+import typing as tp
+
+import aioredis
+
+# KEYS  : one sorted set per window
+# ARGV  : now (ms), unique member, then a (rate, per (ms)) pair per key
+# Returns 0 if a slot was taken in every window, else how many ms to wait
+SLIDING_WINDOW_SCRIPT = b"""
+local now = tonumber(ARGV[1])
+local wait = 0
+
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[1 + i * 2])
+    local per = tonumber(ARGV[2 + i * 2])
+
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', now - per)
+
+    local count = redis.call('ZCARD', key)
+
+    if count >= rate then
+        local freeing = redis.call('ZRANGE', key, count - rate, count - rate, 'WITHSCORES')
+        wait = math.max(wait, tonumber(freeing[2]) + per - now)
+    end
+end
+
+if wait > 0 then
+    return wait
+end
+
+for i, key in ipairs(KEYS) do
+    redis.call('ZADD', key, now, ARGV[2])
+    redis.call('PEXPIRE', key, tonumber(ARGV[2 + i * 2]))
+end
+
+return 0
+"""
+
+SCRIPT_SHA = hashlib.sha1(SLIDING_WINDOW_SCRIPT).hexdigest()
+
+
+class RateLimit(tp.NamedTuple):
+    rate: int
+    per: float  # seconds
+
+
+class RateLimited(Exception):
+    """Raised when waiting for the rate limit would take too long"""
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limited, retry in {retry_after:.2f}s")
+        self.retry_after = retry_after
+
+
+class RedisRateLimiter:
+    """
+    A sliding window rate limiter stored in redis, shared by every process using the same name,
+    every window is checked and updated atomically by a lua script
+
+    limiter = RedisRateLimiter(redis, 'jikan', [RateLimit(30, 60), RateLimit(2, 1)])
+
+    await limiter.acquire()  # waits in line until a request is allowed
+    """
+
+    def __init__(self, redis: aioredis.Redis, name: str, limits: tp.Sequence[RateLimit]):
+        self.redis = redis
+        self.limits = limits
+        self.keys = [f'ratelimit:{name}:{limit.rate}/{limit.per}' for limit in limits]
+
+        self._args = [arg for limit in limits for arg in (limit.rate, int(limit.per * 1000))]
+        self._queue = asyncio.Lock()  # asyncio.Lock wakes its waiters in order
+
+        self.waiting = 0  # how many acquire calls are waiting in line in this process
+
+        self.stats = collections.Counter(acquired=0, waited=0, rejected=0)
+
+    async def _run_script(self, args: list) -> int:
+        try:
+            return await self.redis.evalsha(SCRIPT_SHA, keys=self.keys, args=args)
+
+        except aioredis.ReplyError as error:
+            if not str(error).startswith('NOSCRIPT'):
+                raise
+
+            return await self.redis.eval(SLIDING_WINDOW_SCRIPT, keys=self.keys, args=args)
+
+    async def try_acquire(self) -> float:
+        """Tries to take a slot, returns 0 on success, otherwise how many seconds to wait"""
+
+        # clocks of processes on the same host are close enough for windows of a second or more
+        now = int(time.time() * 1000)
+
+        member = f'{now}-{os.urandom(4).hex()}'
+
+        return await self._run_script([now, member, *self._args]) / 1000
+
+    async def acquire(self, *, timeout: tp.Optional[float] = None) -> None:
+        """
+        Waits in line until a slot is available,
+        raises RateLimited if it would take longer than timeout seconds
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        self.waiting += 1
+
+        try:
+            await asyncio.wait_for(self._queue.acquire(), timeout)
+
+        except asyncio.TimeoutError:
+            self.waiting -= 1
+            self.stats['rejected'] += 1
+            raise RateLimited(timeout) from None
+
+        try:
+            while retry_after := await self.try_acquire():
+
+                if deadline is not None and time.monotonic() + retry_after > deadline:
+                    self.stats['rejected'] += 1
+                    raise RateLimited(retry_after)
+
+                self.stats['waited'] += 1
+
+                await asyncio.sleep(retry_after)
+
+        finally:
+            self.waiting -= 1
+            self._queue.release()
+
+        self.stats['acquired'] += 1
@@ -0,0 +1,88 @@
+"""
+Ayumi - Discord bot
+Copyright (C) 2020 - Saphielle Akiyama | saphielle.akiyama@gmail.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import functools
+import typing as tp
+
+import discord
+
+REACTION_EVENTS = frozenset({'raw_reaction_add', 'raw_reaction_remove'})
+
+Waiter = tp.Tuple[asyncio.Future, tp.Callable[[discord.RawReactionActionEvent], bool]]
+WaiterKey = tp.Tuple[str, int]  # event, message id
+
+
+class ReactionRouter:
+    """
+    Holds the reaction waiters of the menus by message id,
+    so a reaction only gets checked against the menus of its message instead of every live menu
+
+    router = ReactionRouter()
+
+    payload = await router.wait_for('raw_reaction_add', menu.message.id, menu.reaction_check)
+
+    # in the bot's dispatch
+    router.dispatch('raw_reaction_add', payload)
+    """
+
+    def __init__(self):
+        self._waiters: tp.Dict[WaiterKey, tp.List[Waiter]] = {}
+
+    def __len__(self) -> int:
+        """How many messages are waiting for reactions"""
+        return len({message_id for _, message_id in self._waiters})
+
+    def wait_for(self, event: str, message_id: int, check: tp.Callable[[discord.RawReactionActionEvent], bool],
+                 *, timeout: tp.Optional[float] = None) -> tp.Awaitable[discord.RawReactionActionEvent]:
+        """Same as bot.wait_for, for a single message's reactions"""
+        future = asyncio.get_event_loop().create_future()
+
+        key = (event, message_id)
+
+        self._waiters.setdefault(key, []).append((future, check))
+
+        future.add_done_callback(functools.partial(self._forget, key))
+
+        return asyncio.wait_for(future, timeout)
+
+    def _forget(self, key: WaiterKey, future: asyncio.Future) -> None:
+        """Removes a waiter once it's done or cancelled (menu stopped / timed out)"""
+        if (waiters := self._waiters.get(key)) is None:
+            return
+
+        waiters[:] = [waiter for waiter in waiters if waiter[0] is not future]
+
+        if not waiters:
+            del self._waiters[key]
+
+    def dispatch(self, event: str, payload: discord.RawReactionActionEvent) -> None:
+        """Wakes up the waiters of the reacted message whose check passes"""
+        if (waiters := self._waiters.get((event, payload.message_id))) is None:
+            return
+
+        for future, check in tuple(waiters):
+            if future.done():
+                continue
+
+            try:
+                if check(payload):
+                    future.set_result(payload)
+
+            except Exception as error:
+                future.set_exception(error)
@@ -0,0 +1,180 @@
+"""
+Ayumi - Discord bot
+Copyright (C) 2020 - Saphielle Akiyama | saphielle.akiyama@gmail.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import collections
+import contextlib
+import contextvars
+import enum
+import itertools
+import time
+import typing as tp
+
+from .ratelimit import RedisRateLimiter
+
+
+class Priority(enum.IntEnum):
+    INTERACTIVE = 0  # someone is waiting for it
+    BACKGROUND = 1  # refreshing / warming the cache
+
+
+current_priority = contextvars.ContextVar('current_priority', default=Priority.INTERACTIVE)
+
+
+@contextlib.contextmanager
+def request_priority(priority: Priority) -> tp.Generator[None, None, None]:
+    """Sets the priority of the requests scheduled inside of this block (and the tasks it creates)"""
+    token = current_priority.set(priority)
+
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+class QueueFull(Exception):
+    """Raised when too many requests are already waiting"""
+
+
+class QueuedRequest(tp.NamedTuple):
+    priority: Priority
+    order: int  # keeps requests of the same priority first in first out
+    queued_at: float
+    future: asyncio.Future
+    func: tp.Callable[[], tp.Awaitable]
+
+
+class RequestScheduler:
+    """
+    Queues outgoing requests by priority and only sends them when the rate limiter allows it,
+    so only actual api calls use the budget and user requests go before background ones
+
+    scheduler = RequestScheduler(limiter, max_queue=20)
+
+    data = await scheduler.submit(functools.partial(aiojikan.schedule, 'monday'))
+    """
+
+    def __init__(self, limiter: RedisRateLimiter, *, max_queue: int = 20):
+        self.limiter = limiter
+        self.max_queue = max_queue
+
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._order = itertools.count()
+        self._worker: tp.Optional[asyncio.Task] = None
+        self._running: tp.Set[asyncio.Future] = set()
+
+        self.stats = collections.Counter(submitted=0, rejected=0, completed=0, failed=0, cancelled=0)
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def __len__(self) -> int:
+        """How many requests are waiting"""
+        return self._queue.qsize()
+
+    @property
+    def average_wait(self) -> float:
+        return self.total_wait / (self.stats['completed'] + self.stats['failed'] or 1)
+
+    async def submit(self, func: tp.Callable[[], tp.Awaitable], *, priority: tp.Optional[Priority] = None) -> tp.Any:
+        """
+        Queues func and returns its result once it ran,
+        the priority defaults to the one set with request_priority
+        """
+        if self._queue.qsize() >= self.max_queue:
+            self.stats['rejected'] += 1
+            raise QueueFull(f"{self.max_queue} requests are already waiting")
+
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.ensure_future(self._run())
+
+        priority = current_priority.get() if priority is None else priority
+
+        future = asyncio.get_event_loop().create_future()
+
+        self._queue.put_nowait(QueuedRequest(priority, next(self._order), time.monotonic(), future, func))
+
+        self.stats['submitted'] += 1
+
+        return await future
+
+    async def _run(self) -> None:
+        """Sends the queued requests one after another, as fast as the limiter allows"""
+        while True:
+            # only peeks, the request is picked once the budget allows it so late user requests can go first
+            self._queue.put_nowait(await self._queue.get())
+
+            try:
+                await self.limiter.acquire()
+
+            except Exception as error:  # redis being down shouldn't kill the worker
+                if (request := self._next_request()) is not None:
+                    request.future.set_exception(error)
+
+                continue
+
+            if (request := self._next_request()) is None:  # everyone gave up while we were waiting
+                continue
+
+            waited = time.monotonic() - request.queued_at
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+
+            # the request itself runs concurrently, only the budget is handed out in order
+            task = asyncio.ensure_future(request.func())
+            self._running.add(task)
+            task.add_done_callback(lambda t, f=request.future: self._on_request_done(t, f))
+
+    def _next_request(self) -> tp.Optional[QueuedRequest]:
+        """Pops the request with the highest priority that's still awaited"""
+        while not self._queue.empty():
+            request = self._queue.get_nowait()
+
+            if not request.future.done():
+                return request
+
+            self.stats['cancelled'] += 1
+
+        return None
+
+    def _on_request_done(self, task: asyncio.Future, future: asyncio.Future) -> None:
+        self._running.discard(task)
+
+        if task.cancelled():
+            future.cancel()
+            return
+
+        if (error := task.exception()) is not None:
+            self.stats['failed'] += 1
+
+            if not future.done():
+                future.set_exception(error)
+
+            return
+
+        self.stats['completed'] += 1
+
+        if not future.done():
+            future.set_result(task.result())
+
+    def close(self) -> None:
+        """Stops sending requests, the ones that are waiting get cancelled"""
+        if self._worker is not None:
+            self._worker.cancel()
+
+        while not self._queue.empty():
+            self._queue.get_nowait().future.cancel()
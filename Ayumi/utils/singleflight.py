@@ -0,0 +1,114 @@
+"""
+Ayumi - Discord bot
+Copyright (C) 2020 - Saphielle Akiyama | saphielle.akiyama@gmail.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import collections
+import functools
+import typing as tp
+
+from .scheduler import RequestScheduler
+
+FlightKey = tp.Tuple[tp.Hashable, ...]
+
+
+def make_flight_key(name: str, args: tuple, kwargs: dict) -> FlightKey:
+    """Builds a hashable key out of an endpoint name and its arguments"""
+    return (name, args, tuple(sorted(kwargs.items())))
+
+
+class SingleFlight:
+    """
+    Makes sure that only one call per key is running at a time,
+    every concurrent caller awaits the same future and gets the same result
+
+    flight = SingleFlight()
+
+    # both of those only trigger a single request
+    await asyncio.gather(flight.do('key', fetch), flight.do('key', fetch))
+    """
+
+    def __init__(self):
+        self._in_flight: tp.Dict[tp.Hashable, asyncio.Future] = {}
+        self.stats = collections.Counter(calls=0, coalesced=0)
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
+
+    async def do(self, key: tp.Hashable, func: tp.Callable[..., tp.Awaitable], *args, **kwargs) -> tp.Any:
+        """Runs func(*args, **kwargs) or joins the call that is already running for this key"""
+
+        if (future := self._in_flight.get(key)) is not None:
+            self.stats['coalesced'] += 1
+
+        else:
+            self.stats['calls'] += 1
+
+            future = asyncio.ensure_future(func(*args, **kwargs))
+
+            self._in_flight[key] = future
+
+            future.add_done_callback(functools.partial(self._forget, key))
+
+        # a cancelled waiter must not cancel the call for everyone else
+        return await asyncio.shield(future)
+
+    def _forget(self, key: tp.Hashable, future: asyncio.Future) -> None:
+        """Removes a finished call so the next one hits the api again"""
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+
+        if not future.cancelled():
+            future.exception()  # marks the exception as retrieved when nobody was left waiting
+
+
+class CoalescingClient:
+    """
+    Wraps an api client so concurrent identical calls (same method, same arguments)
+    only hit the api once, other attributes are forwarded as is,
+    calls go through the scheduler if one is given
+
+    aiojikan = CoalescingClient(jikanpy.AioJikan(), scheduler=scheduler)
+    await aiojikan.schedule('monday')
+    """
+
+    def __init__(self, client: tp.Any, *, flight: tp.Optional[SingleFlight] = None,
+                 scheduler: tp.Optional[RequestScheduler] = None):
+        self.client = client
+        self.flight = flight or SingleFlight()
+        self.scheduler = scheduler
+
+    @property
+    def stats(self) -> collections.Counter:
+        return self.flight.stats
+
+    def __getattr__(self, name: str) -> tp.Any:
+        attr = getattr(self.client, name)
+
+        if not asyncio.iscoroutinefunction(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def coalesced(*args, **kwargs):
+            key = make_flight_key(name, args, kwargs)
+
+            if self.scheduler is None:
+                return await self.flight.do(key, attr, *args, **kwargs)
+
+            return await self.flight.do(key, self.scheduler.submit, functools.partial(attr, *args, **kwargs))
+
+        return coalesced
@@ -0,0 +1,89 @@
+"""
+Ayumi - Discord bot
+Copyright (C) 2020 - Saphielle Akiyama | saphielle.akiyama@gmail.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+import inspect
+import textwrap
+import typing as tp
+
+from discord.ext import commands
+
+GITHUB_PATH = '/blob/master/Ayumi/'
+
+
+class CommandSource(tp.NamedTuple):
+    module: str  # path of the file, relative to the bot's folder
+    line_number: int
+    source: str  # dedented
+    github_link: tp.Optional[str]  # None if no repository is configured
+
+
+class SourceIndex:
+    """
+    The source of every command, read once when their cog is added
+    so looking it up later doesn't touch the filesystem
+
+    index = SourceIndex()
+    index.add_cog(cog, github_url=config['github']['url'])
+    index.get('mal schedule monday')
+    """
+
+    def __init__(self):
+        self._sources: tp.Dict[str, CommandSource] = {}  # qualified name -> source
+        self._cogs: tp.Dict[str, tp.List[str]] = {}  # cog name -> qualified names
+
+    def __len__(self) -> int:
+        return len(self._sources)
+
+    def get(self, qualified_name: str) -> tp.Optional[CommandSource]:
+        return self._sources.get(qualified_name)
+
+    @staticmethod
+    def read(callback: tp.Callable, *, github_url: tp.Optional[str]) -> tp.Optional[CommandSource]:
+        """Reads the source of a callback (or class), blocking, None if it's not available"""
+        try:
+            source_lines, line_number = inspect.getsourcelines(callback)
+        except (OSError, TypeError):
+            return None
+
+        module = callback.__module__.replace('.', '/') + '.py'
+
+        github_link = f"{github_url}{GITHUB_PATH}{module}#L{line_number}" if github_url else None
+
+        return CommandSource(module, line_number, textwrap.dedent(''.join(source_lines)), github_link)
+
+    def add_cog(self, cog: commands.Cog, *, github_url: tp.Optional[str],
+                extra: tp.Optional[tp.Mapping[str, tp.Callable]] = None) -> None:
+        """
+        Indexes the commands of a cog (subcommands made in its __init__ included),
+        extra maps other commands owned by the cog to what their source is
+        """
+        self.remove_cog(cog.qualified_name)
+
+        callbacks = {command.qualified_name: command.callback for command in cog.walk_commands()}
+        callbacks.update(extra or {})
+
+        for name, callback in callbacks.items():
+            if (source := self.read(callback, github_url=github_url)) is not None:
+                self._sources[name] = source
+
+        self._cogs[cog.qualified_name] = [*callbacks]
+
+    def remove_cog(self, name: str) -> None:
+        for qualified_name in self._cogs.pop(name, ()):
+            self._sources.pop(qualified_name, None)
@@ -0,0 +1,138 @@
+"""
+Ayumi - Discord bot
+Copyright (C) 2020 - Saphielle Akiyama | saphielle.akiyama@gmail.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import hashlib
+import sys
+import threading
+import time
+import traceback
+import typing as tp
+
+from . import metrics
+
+LOOP_LAG = metrics.REGISTRY.gauge('ayumi_loop_lag_seconds', 'How late the event loop was on the last check')
+
+LOOP_STALLS = metrics.REGISTRY.counter('ayumi_loop_stalls_total', 'Times the event loop was blocked for too long')
+
+
+class Stall(tp.NamedTuple):
+    duration: float  # how long the loop was blocked, in seconds
+    stack: str  # what it was running while blocked
+    fingerprint: str
+
+
+class LoopWatchdog:
+    """
+    Measures the event loop's lag continuously, a thread samples the loop's stack
+    when it's blocked for longer than threshold and report is called with it once the loop is back,
+    the same stack is only reported once per cooldown
+
+    watchdog = LoopWatchdog(bot.loop, report=send_to_webhook)
+    watchdog.start()
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, *, report: tp.Callable[[Stall], tp.Awaitable],
+                 interval: float = 0.1, threshold: float = 0.5, cooldown: float = 600):
+        self.loop = loop
+        self.report = report
+        self.interval = interval
+        self.threshold = threshold
+        self.cooldown = cooldown
+
+        self.max_lag = 0.0
+
+        self._heartbeat = time.monotonic()
+        self._loop_thread: tp.Optional[int] = None
+        self._ticker: tp.Optional[asyncio.Task] = None
+        self._thread: tp.Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+        self._reported: tp.Dict[str, float] = {}  # fingerprint: when it was reported
+
+    def start(self) -> None:
+        """Starts watching, must be called from the loop's thread"""
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+
+        self._ticker = self.loop.create_task(self._tick())
+
+        self._thread = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+        if self._ticker is not None:
+            self._ticker.cancel()
+
+    # -- Loop side -- #
+
+    async def _tick(self) -> None:
+        """Beats every interval, how late it wakes up is the lag"""
+        while True:
+            before = time.monotonic()
+            await asyncio.sleep(self.interval)
+
+            now = time.monotonic()
+            lag = max(now - before - self.interval, 0)
+
+            self._heartbeat = now
+            self.max_lag = max(self.max_lag, lag)
+            LOOP_LAG.set(lag)
+
+    def _on_stall(self, stall: Stall) -> None:
+        LOOP_STALLS.inc()
+
+        now = time.monotonic()
+
+        if now - self._reported.get(stall.fingerprint, -self.cooldown) < self.cooldown:
+            return
+
+        self._reported[stall.fingerprint] = now
+
+        self.loop.create_task(self.report(stall))
+
+    # -- Watcher thread -- #
+
+    def _watch(self) -> None:
+        """Runs in its own thread so it can look at the loop while it's blocked"""
+        while not self._stop.wait(self.interval):
+            blocked_for = time.monotonic() - self._heartbeat
+
+            if blocked_for - self.interval < self.threshold:
+                continue
+
+            if (frame := sys._current_frames().get(self._loop_thread)) is None:
+                continue
+
+            stack = ''.join(traceback.format_stack(frame))
+            heartbeat = self._heartbeat
+
+            while heartbeat == self._heartbeat and not self._stop.wait(self.interval):  # waits for it to end
+                pass
+
+            duration = time.monotonic() - heartbeat - self.interval
+
+            fingerprint = hashlib.sha1(stack.encode()).hexdigest()[:12]
+
+            try:
+                self.loop.call_soon_threadsafe(self._on_stall, Stall(duration, stack, fingerprint))
+            except RuntimeError:  # the loop was closed
+                return